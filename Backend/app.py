@@ -1,121 +1,156 @@
-from flask import Flask, request, session, jsonify, send_from_directory
+from flask import Flask, Request, request, session, jsonify, send_from_directory
 from flask_cors import CORS
 from pymongo import MongoClient
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from bson.objectid import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
-import joblib
+import logging
+import mimetypes
 import os
 import re
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
+from catalog import build_catalog_index
+from matching import MatchResult, build_matchers
+from cache import TTLCache
+from json_provider import init_json
+from images import DerivativeWorker, UploadSpool, is_content_addressed, sweep_spool_dir
+from export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, export_response
+from model_registry import ModelRegistry
+from compiled_forest import compile_model
+from brand_classifier import BrandClassifier
+from feature_schema import FeatureSchema, PRICE_CATEGORICAL_FIELDS, load_price_dataset
+from fallback_model import FallbackTrainer
+from inference_batcher import MicroBatcher
+from prediction_cache import ModelVersion, PredictionCache
+from log_config import configure_logging, get_logger
+from search import build_filters, build_search_pipeline, format_facets
+from ratings import rating_summary, record_rating, remove_buyer_ratings, start_reconciler
+from view_counter import ViewCounter
+from db_indexes import ensure_indexes, explain_hot_queries, index_report
+from mongo_pool import PoolMetrics, browse_collection, pool_options
+from pagination import CountCache, InvalidCursor, encode_cursor, keyset_match, keyset_sort
 
 # ----------------- Load environment variables -----------------
 load_dotenv()
 
+# ----------------- Logging -----------------
+configure_logging()
+logger = get_logger("app")
+
 app = Flask(__name__)
+# ObjectId, datetime and numpy values are encoded by the JSON provider itself
+json_backend = init_json(app, use_orjson=os.getenv("USE_ORJSON", "true").lower() == "true")
 app.secret_key = os.getenv("SECRET_KEY", "supersecret")
 
 # Enable CORS for React frontend
-CORS(app, supports_credentials=True, origins=["http://localhost:3000"])
+CORS_ORIGINS = ["http://localhost:3000"]
+CORS(app, supports_credentials=True, origins=CORS_ORIGINS)
 
 # ----------------- MongoDB connection -----------------
 mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(mongo_uri)
+# Pool size and timeouts come from MONGO_* settings (mongo_pool.py);
+# pool_metrics counts checkouts and wait times for /api/debug/db_pool
+pool_metrics = PoolMetrics()
+client = MongoClient(mongo_uri, event_listeners=[pool_metrics], **pool_options())
 db = client.vehicle_marketplace
 users_collection = db.users
 cars_collection = db.cars
 ratings_collection = db.ratings
 
+# Public browse/search/ratings reads may be served by secondaries; auth,
+# writes and read-your-own-writes views stay on the primary collections above
+browse_cars = browse_collection(db, "cars")
+browse_users = browse_collection(db, "users")
+browse_ratings = browse_collection(db, "ratings")
+
 # Upload folder for images
 app.config['UPLOAD_FOLDER'] = 'uploads'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Allowed image extensions
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Uploads are stored under their content hash; resized/WebP variants are
+# generated in the background
+image_derivatives = DerivativeWorker(
+    app.config['UPLOAD_FOLDER'],
+    widths=tuple(int(w) for w in os.getenv("IMAGE_WIDTHS", "320,640,1280").split(",")),
+    max_workers=int(os.getenv("IMAGE_WORKERS", 2)),
+    logger=logger
+)
+
+# Multipart file parts are streamed straight into spool files in
+# UPLOAD_TMP_DIR (same filesystem, so finalizing is a rename), with the type
+# sniffed from magic bytes as they arrive. MAX_CONTENT_LENGTH caps the whole
+# request; MAX_UPLOAD_FILE_MB caps each image.
+UPLOAD_TMP_DIR = os.path.join(app.config['UPLOAD_FOLDER'], ".incoming")
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+MAX_UPLOAD_FILE_SIZE = int(os.getenv("MAX_UPLOAD_FILE_MB", 10)) * 1024 * 1024
+MAX_IMAGES_PER_LISTING = int(os.getenv("MAX_IMAGES_PER_LISTING", 10))
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_REQUEST_MB", 60)) * 1024 * 1024
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Only listing images are spooled; other uploads (the batch CSV) use
+        # Werkzeug's default buffering
+        if self.endpoint != "create_listing":
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        spool = UploadSpool(UPLOAD_TMP_DIR, MAX_UPLOAD_FILE_SIZE)
+        # Tracked here as well as in request.files, which is never filled
+        # in when parsing aborts (413, disconnect) after some parts spooled
+        self.__dict__.setdefault("_spools", []).append(spool)
+        return spool
+
+    def close(self):
+        super().close()
+        # Spools not claimed by a listing job are deleted with the request
+        for spool in self.__dict__.get("_spools", ()):
+            spool.close()
+
+app.request_class = UploadRequest
+
+# Parts left behind by a crashed worker
+sweep_spool_dir(UPLOAD_TMP_DIR, max_age=int(os.getenv("UPLOAD_SPOOL_MAX_AGE", 3600)), logger=logger)
 
 # ----------------- Load dataset -----------------
 try:
-    car_data = pd.read_csv("csv/car_price_dataset.csv")
-    
-    # Clean and prepare the dataset to match your training data
-    current_year = datetime.now().year
-    car_data['Car_Age'] = current_year - car_data['YOM']
-    
-    car_data.rename(columns={
-        'Brand': 'make',
-        'Model': 'model',
-        'YOM': 'year',
-        'Fuel Type': 'fuel_type',
-        'Gear': 'transmission_type',
-        'Condition': 'condition',
-        'Millage(KM)': 'mileage',
-        'Engine (cc)': 'engine',
-        'Town': 'town',
-        'Leasing': 'leasing'
-    }, inplace=True)
-
-    for col in ['make', 'model', 'condition', 'fuel_type', 'transmission_type', 'town', 'leasing']:
-        if col in car_data.columns:
-            car_data[col] = car_data[col].astype(str).str.lower().str.strip()
-
-    print("✅ Dataset loaded and cleaned successfully")
-    print(f"Dataset shape: {car_data.shape}")
-    print(f"Available makes: {sorted(car_data['make'].unique())}")
+    car_data = load_price_dataset("csv/car_price_dataset.csv")
+    logger.info("Dataset loaded", extra={"rows": car_data.shape[0], "columns": car_data.shape[1]})
     
 except Exception as e:
-    print(f"❌ Error loading dataset: {e}")
+    logger.error("Error loading dataset: %s", e)
     car_data = pd.DataFrame()
 
 # ----------------- Load Retrained ML Model -----------------
-try:
-    price_model = joblib.load("models/car_price_model_retrained.joblib")
-    print("✅ Retrained price prediction model loaded successfully")
-    
-    try:
-        brand_encoder = joblib.load("models/brand_encoder.joblib")
-        print("✅ Brand encoder loaded successfully")
-    except:
-        print("⚠️ Brand encoder not found, creating from dataset...")
-        brand_encoder = None
-    
-    print("🔄 Creating label encoders from current dataset...")
-    label_encoders = {}
-    categorical_columns = ['make', 'model', 'fuel_type', 'transmission_type', 'condition', 'town', 'leasing']
-    
-    for col in categorical_columns:
-        if col in car_data.columns:
-            le = LabelEncoder()
-            unique_values = car_data[col].dropna().unique()
-            le.fit(unique_values)
-            label_encoders[col] = le
-            print(f"✅ Created encoder for {col}: {len(unique_values)} unique values - {list(unique_values)[:5]}...")
-        else:
-            print(f"❌ Column '{col}' not found in dataset")
-    
-    print(f"✅ Label encoders created for: {list(label_encoders.keys())}")
-    
-except Exception as e:
-    print(f"❌ Error loading ML model: {e}")
-    price_model = None
-    label_encoders = {}
-
-try:
-    multi_target_model = joblib.load("models/multi_target_classifier.joblib")
-    classifier_label_encoders = joblib.load("models/classifier_label_encoders.joblib")
-    print("✅ Multi-target brand/model classifier and encoders loaded successfully")
-except Exception as e:
-    print(f"❌ Error loading multi-target classifier or encoders: {e}")
-    multi_target_model = None
-    classifier_label_encoders = {}
+PRICE_MODEL_PATH = "models/car_price_model_retrained.joblib"
+BRAND_MODEL_FILES = {
+    "model": "models/multi_target_classifier.joblib",
+    "encoders": "models/classifier_label_encoders.joblib"
+}
+SMALLER_BRAND_MODEL_FILES = {
+    "model": "models/smaller_multi_target_classifier.joblib",
+    "encoders": "models/smaller_classifier_label_encoders.joblib"
+}
+
+# Models are loaded on first use, once per worker. Run gunicorn with
+# --preload and PRELOAD_MODELS=true to load them once in the master instead,
+# so the workers share the forests' arrays copy-on-write after the fork.
+model_registry = ModelRegistry(
+    mmap_mode=os.getenv("MODEL_MMAP_MODE") or None,
+    retry_interval=float(os.getenv("MODEL_RETRY_INTERVAL", 30)),
+    check_interval=float(os.getenv("MODEL_CHECK_INTERVAL", 5)),
+    logger=logger
+)
+model_registry.register("brand_model", BRAND_MODEL_FILES, SMALLER_BRAND_MODEL_FILES,
+                        compiler=BrandClassifier.from_bundle)
+
+def get_brand_classifier():
+    """The ``BrandClassifier`` for brand/model prediction, or None if unavailable."""
+    classifier = model_registry.get("brand_model")
+    return classifier if isinstance(classifier, BrandClassifier) else None
 
 # ----------------- Helpers -----------------
 def login_required(f):
@@ -126,17 +161,6 @@ def login_required(f):
         return f(*args, **kwargs)
     return wrapper
 
-def serialize_objectid(obj):
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, dict):
-        return {k: serialize_objectid(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [serialize_objectid(v) for v in obj]
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
-
 def sanitize_input(data):
     if isinstance(data, dict):
         return {k: sanitize_input(v) for k, v in data.items()}
@@ -151,63 +175,6 @@ def sanitize_input(data):
             return sanitize_input(data.iloc[0])
     return data
 
-def find_closest_match(input_value, available_classes, field_name=""):
-    if available_classes is None or len(available_classes) == 0:
-        print(f"❌ No available classes for {field_name}")
-        return None
-        
-    input_value = str(input_value).lower().strip()
-    
-    if hasattr(available_classes, 'tolist'):
-        available_classes_list = available_classes.tolist()
-    else:
-        available_classes_list = list(available_classes)
-    
-    available_classes_lower = [str(cls).lower().strip() for cls in available_classes_list]
-    
-    print(f"🔍 Searching for '{input_value}' in {field_name}")
-    print(f"Available options: {available_classes_lower[:10]}...")
-    
-    if input_value in available_classes_lower:
-        idx = available_classes_lower.index(input_value)
-        matched_value = available_classes_list[idx]
-        print(f"✅ Exact match found: '{matched_value}'")
-        return matched_value
-    
-    for i, cls in enumerate(available_classes_lower):
-        if input_value in cls or cls in input_value:
-            matched_value = available_classes_list[i]
-            print(f"✅ Partial match found: '{matched_value}' for '{input_value}'")
-            return matched_value
-    
-    common_mappings = {
-        'petrol': 'gasoline',
-        'gasoline': 'petrol',
-        'manual': 'manual',
-        'automatic': 'auto',
-        'auto': 'automatic',
-        'used': 'used',
-        'new': 'new',
-        'brand new': 'new',
-        'no': 'no leasing',
-        'yes': 'leasing',
-        'leasing': 'leasing',
-        'no leasing': 'no leasing',
-        'ongoing lease': 'ongoing lease',
-        'no lease': 'no leasing'
-    }
-    
-    if input_value in common_mappings:
-        alternative = common_mappings[input_value]
-        if alternative in available_classes_lower:
-            idx = available_classes_lower.index(alternative)
-            matched_value = available_classes_list[idx]
-            print(f"✅ Mapped match found: '{matched_value}' for '{input_value}' -> '{alternative}'")
-            return matched_value
-    
-    print(f"❌ No match found for '{input_value}' in {field_name}")
-    return None
-
 def format_price_lkr(price):
     if price >= 10000000:
         crores = price / 10000000
@@ -221,55 +188,26 @@ def format_price_lkr(price):
     else:
         return f"LKR {price:.0f}"
 
-def create_smaller_model():
+# Without the full classifier, one process trains the smaller fallback in
+# the background; until it lands /api/health reports "degraded" and
+# /api/predict_brand_model answers 503
+fallback_trainer = FallbackTrainer(
+    "csv/car_price_dataset.csv",
+    SMALLER_BRAND_MODEL_FILES["model"],
+    SMALLER_BRAND_MODEL_FILES["encoders"],
+    logger=logger
+)
+if not model_registry.available("brand_model") and os.getenv("TRAIN_FALLBACK_MODEL", "true").lower() == "true":
+    if fallback_trainer.start():
+        logger.warning("Multi-target classifier unavailable, training a smaller model in the background")
+
+# ----------------- Indexes -----------------
+# Declared in db_indexes.py; creation is idempotent, so every worker can run it
+if os.getenv("ENSURE_INDEXES", "true").lower() == "true":
     try:
-        df = pd.read_csv("csv/car_price_dataset.csv")
-        features = ['condition', 'gear', 'fuel_type', 'yom', 'engine', 'price']
-        target_brand = 'brand'
-        target_model = 'model'
-        
-        df = df[features + [target_brand, target_model]].dropna()
-        
-        label_encoders = {}
-        for col in features:
-            if df[col].dtype == 'object':
-                le = LabelEncoder()
-                df[col] = le.fit_transform(df[col])
-                label_encoders[col] = le
-        
-        brand_encoder = LabelEncoder()
-        model_encoder = LabelEncoder()
-        df[target_brand] = brand_encoder.fit_transform(df[target_brand])
-        df[target_model] = model_encoder.fit_transform(df[target_model])
-        
-        X = df[features]
-        y_brand = df[target_brand]
-        y_model = df[target_model]
-        
-        model = RandomForestClassifier(n_estimators=50, max_depth=10, random_state=42)
-        
-        model.fit(X, y_brand)  # Simplified: training only for brand
-        joblib.dump(model, "models/smaller_multi_target_classifier.joblib")
-        joblib.dump(label_encoders, "models/smaller_classifier_label_encoders.joblib")
-        joblib.dump(brand_encoder, "models/smaller_brand_encoder.joblib")
-        joblib.dump(model_encoder, "models/smaller_model_encoder.joblib")
-        
-        print("✅ Smaller model created and saved successfully")
-        
-    except Exception as e:
-        print(f"❌ Error creating smaller model: {e}")
-
-if multi_target_model is None:
-    print("🔄 Attempting to create a smaller model...")
-    create_smaller_model()
-    try:
-        multi_target_model = joblib.load("models/smaller_multi_target_classifier.joblib")
-        classifier_label_encoders = joblib.load("models/smaller_classifier_label_encoders.joblib")
-        print("✅ Smaller multi-target classifier and encoders loaded successfully")
+        ensure_indexes(db, logger=logger)
     except Exception as e:
-        print(f"❌ Error loading smaller model: {e}")
-        multi_target_model = None
-        classifier_label_encoders = {}
+        logger.error("Error ensuring indexes: %s", e)
 
 # ----------------- Default Admin -----------------
 def create_default_admin():
@@ -285,357 +223,665 @@ def create_default_admin():
                 "role": "admin",
                 "created_at": datetime.utcnow()
             })
-            print("✅ Default admin created")
+            logger.info("Default admin created")
         else:
             if not admin_user.get("password") or not admin_user["password"].startswith('pbkdf2:'):
                 users_collection.update_one(
                     {"email": admin_email},
                     {"$set": {"password": generate_password_hash("admin123", method='pbkdf2:sha256')}}
                 )
-                print("✅ Admin password rehashed")
+                logger.info("Admin password rehashed")
             else:
-                print("ℹ️ Admin already exists")
+                logger.debug("Admin already exists")
     except Exception as e:
-        print(f"❌ Error creating default admin: {e}")
+        logger.error("Error creating default admin: %s", e)
 
 create_default_admin()
 
 # ----------------- Dynamic Dropdown Endpoints -----------------
+# Dropdown values are precomputed once; each endpoint is a dict lookup
+# returning a pre-serialized body that browsers can revalidate by ETag.
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 300))
+catalog_index = build_catalog_index(car_data)
+
+def catalog_response(payload):
+    response = app.response_class(payload.body, mimetype="application/json")
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CATALOG_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route("/api/catalog", methods=["GET"])
+def get_catalog():
+    if catalog_index is None:
+        return jsonify({"error": "Data not available"}), 500
+    return catalog_response(catalog_index.catalog)
+
 @app.route("/api/makes", methods=["GET"])
 def get_makes():
-    if car_data.empty:
+    if catalog_index is None:
         return jsonify({"error": "Data not available"}), 500
-    makes = sorted(car_data['make'].dropna().unique().tolist())
-    return jsonify(makes)
+    return catalog_response(catalog_index.makes)
 
 @app.route("/api/models/<make>", methods=["GET"])
 def get_models(make):
-    if car_data.empty:
+    if catalog_index is None:
         return jsonify({"error": "Data not available"}), 500
-    make = make.lower()
-    filtered = car_data[car_data['make'] == make]
-    models = sorted(filtered['model'].dropna().unique().tolist())
-    return jsonify(models)
+    return catalog_response(catalog_index.lookup(catalog_index.models, make.lower()))
 
 @app.route("/api/years/<make>/<model>", methods=["GET"])
 def get_years(make, model):
-    if car_data.empty:
+    if catalog_index is None:
         return jsonify({"error": "Data not available"}), 500
-    make = make.lower()
-    model = model.lower()
-    filtered = car_data[(car_data['make'] == make) & (car_data['model'] == model)]
-    years = sorted(filtered['year'].dropna().unique().tolist(), reverse=True)
-    return jsonify(years)
+    return catalog_response(catalog_index.lookup(catalog_index.years, make.lower(), model.lower()))
 
-@app.route("/api/fuel_types/<make>/<model>/<year>", methods=["GET"])
-def get_fuel_types(make, model, year):
-    if car_data.empty:
+def _year_level_lookup(table, make, model, year):
+    if catalog_index is None:
         return jsonify({"error": "Data not available"}), 500
-    make = make.lower()
-    model = model.lower()
     try:
         year = int(year)
     except ValueError:
         return jsonify({"error": "Invalid year"}), 400
-    filtered = car_data[(car_data['make'] == make) & (car_data['model'] == model) & (car_data['year'] == year)]
-    fuel_types = sorted(filtered['fuel_type'].dropna().unique().tolist())
-    return jsonify(fuel_types)
+    return catalog_response(catalog_index.lookup(getattr(catalog_index, table), make.lower(), model.lower(), year))
+
+@app.route("/api/fuel_types/<make>/<model>/<year>", methods=["GET"])
+def get_fuel_types(make, model, year):
+    return _year_level_lookup("fuel_types", make, model, year)
 
 @app.route("/api/transmissions/<make>/<model>/<year>", methods=["GET"])
 def get_transmissions(make, model, year):
-    if car_data.empty:
-        return jsonify({"error": "Data not available"}), 500
-    make = make.lower()
-    model = model.lower()
-    try:
-        year = int(year)
-    except ValueError:
-        return jsonify({"error": "Invalid year"}), 400
-    filtered = car_data[(car_data['make'] == make) & (car_data['model'] == model) & (car_data['year'] == year)]
-    transmissions = sorted(filtered['transmission_type'].dropna().unique().tolist())
-    return jsonify(transmissions)
+    return _year_level_lookup("transmissions", make, model, year)
 
 @app.route("/api/engine_sizes/<make>/<model>/<year>", methods=["GET"])
 def get_engine_sizes(make, model, year):
-    if car_data.empty:
-        return jsonify({"error": "Data not available"}), 500
-    make = make.lower()
-    model = model.lower()
-    try:
-        year = int(year)
-    except ValueError:
-        return jsonify({"error": "Invalid year"}), 400
-    filtered = car_data[(car_data['make'] == make) & (car_data['model'] == model) & (car_data['year'] == year)]
-    engines = sorted(filtered['engine'].dropna().unique().tolist())
-    return jsonify(engines)
+    return _year_level_lookup("engine_sizes", make, model, year)
 
 @app.route("/api/towns", methods=["GET"])
 def get_towns():
-    if car_data.empty:
+    if catalog_index is None:
         return jsonify({"error": "Data not available"}), 500
-    towns = sorted(car_data['town'].dropna().unique().tolist())
-    return jsonify(towns)
+    return catalog_response(catalog_index.towns)
 
 @app.route("/api/mileage_ranges", methods=["GET"])
 def get_mileage_ranges():
-    if car_data.empty:
+    if catalog_index is None:
         return jsonify({"error": "Data not available"}), 500
-    max_mileage = car_data[car_data['condition'] == 'used']['mileage'].max()
-    step = 10000
-    bins = np.arange(0, max_mileage + step + 1, step)
-    ranges = [f"{int(bins[i])}-{int(bins[i+1] - 1)}" for i in range(len(bins) - 1)]
-    ranges[-1] = f"{int(bins[-2])}+"
-    return jsonify(ranges)
+    return catalog_response(catalog_index.mileage_ranges)
 
 # ----------------- Price Prediction Endpoint -----------------
-@app.route("/api/predict_price", methods=["POST"])
-def predict_price():
-    if price_model is None or not label_encoders:
-        return jsonify({"error": "Model or encoders not loaded"}), 500
+# Column order and category codes come from the feature schema written
+# next to the model at training time; the registry checks the model's hash
+# against it whenever it (re)loads the model
+PRICE_SCHEMA_PATH = "models/car_price_feature_schema.json"
+
+try:
+    price_schema = FeatureSchema.load(PRICE_SCHEMA_PATH)
+    logger.info("Price feature schema loaded", extra={"created_at": price_schema.created_at})
+except FileNotFoundError:
+    logger.warning("Feature schema %s not found, deriving categories from the dataset", PRICE_SCHEMA_PATH)
+    price_schema = FeatureSchema.from_dataset(car_data) if not car_data.empty else None
+except Exception as e:
+    logger.error("Error loading price feature schema: %s", e)
+    price_schema = None
+
+PRICE_FEATURE_ORDER = price_schema.feature_order if price_schema else []
+
+# PRICE_MODEL_BACKEND=compiled serves single rows and micro-batches through
+# the flattened NumPy evaluator in compiled_forest.py (parity-checked against
+# sklearn on load); calls with more than COMPILED_MAX_ROWS rows, i.e. the
+# batch endpoint, still go to the sklearn model, which is faster there
+PRICE_MODEL_BACKEND = os.getenv("PRICE_MODEL_BACKEND", "compiled").lower()
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", 128))
+
+def compile_price_model(model):
+    return compile_model(model, max_rows=COMPILED_MAX_ROWS)
+
+model_registry.register("price_model", PRICE_MODEL_PATH,
+                        compiler=compile_price_model if PRICE_MODEL_BACKEND == "compiled" else None,
+                        check=price_schema.verify if price_schema else None)
+
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", 5000))
+
+PRICE_FIELD_LABELS = {
+    'make': 'Make',
+    'model': 'Model',
+    'fuel_type': 'Fuel type',
+    'transmission_type': 'Transmission',
+    'condition': 'Condition',
+    'town': 'Town',
+    'leasing': 'Leasing'
+}
+# Extra context returned when a field cannot be matched: (response key, max classes listed)
+PRICE_MATCH_HINTS = {
+    'make': ("available_makes", 10),
+    'fuel_type': ("available_fuel_types", None),
+    'transmission_type': ("available_transmissions", None),
+    'condition': ("available_conditions", None),
+    'town': ("available_towns", 10)
+}
+
+# Built once from the schema so matching never rescans the class lists
+price_matchers = build_matchers(price_schema.categories if price_schema else {})
+
+def _default_leasing_match():
+    matcher = price_matchers.get('leasing')
+    if matcher is None or not len(matcher):
+        return None
+    if not car_data.empty:
+        result = matcher.match(car_data['leasing'].mode().iloc[0])
+        if result is not None:
+            return MatchResult(result.value, result.code, 0.0, "default")
+    return MatchResult(matcher.classes[0], 0, 0.0, "default")
+
+default_leasing_match = _default_leasing_match()
+
+# Repeat predictions are served from memory; the version drops every entry
+# when the registry reloads the model or the encoders change.
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", 3600))
+)
+# Concurrent single-row predictions queued while the model is busy are
+# coalesced into one call (up to INFERENCE_BATCH_SIZE rows); an idle model
+# takes a request at once unless INFERENCE_BATCH_WAIT_MS holds batches open.
+# A batch size of 1 calls the model directly
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", 64))
+INFERENCE_BATCH_WAIT = float(os.getenv("INFERENCE_BATCH_WAIT_MS", 0)) / 1000
+
+def predict_price_rows(X):
+    return model_registry.get("price_model").predict(X)
+
+def predict_brand_rows(X):
+    return get_brand_classifier().predict_rows(X)
+
+price_batcher = MicroBatcher(predict_price_rows, INFERENCE_BATCH_SIZE, INFERENCE_BATCH_WAIT, "price", logger)
+brand_batcher = MicroBatcher(predict_brand_rows, INFERENCE_BATCH_SIZE, INFERENCE_BATCH_WAIT, "brand", logger)
+
+price_model_version = ModelVersion(model_registry, "price_model", price_schema.categories if price_schema else {})
+
+# Loads every model in the master when gunicorn runs with --preload
+if os.getenv("PRELOAD_MODELS", "false").lower() == "true":
+    model_registry.preload()
+
+def match_price_field(col, value):
+    result = price_matchers[col].match(value)
+    if result is None and col == 'leasing':
+        return default_leasing_match
+    return result
+
+def match_error(col, value):
+    error = {"error": f"{PRICE_FIELD_LABELS[col]} '{value}' not found"}
+    if col in PRICE_MATCH_HINTS:
+        key, limit = PRICE_MATCH_HINTS[col]
+        error[key] = price_matchers[col].classes[:limit]
+    return error
+
+def parse_price_fields(data):
+    """Validate one prediction request and derive its numeric features.
+
+    Returns ``(fields, None)`` on success or ``(None, error_message)``.
+    """
+    fields = {
+        "make": sanitize_input(data.get("make", "")),
+        "model": sanitize_input(data.get("model", "")),
+        "fuel_type": sanitize_input(data.get("fuel_type", "")),
+        "transmission_type": sanitize_input(data.get("transmission_type", "")),
+        "town": sanitize_input(data.get("town", "")),
+        "leasing": data.get("leasing", "no leasing"),
+    }
+    year = data.get("year")
+    engine = data.get("engine")
+    condition_input = sanitize_input(data.get("condition", ""))
+    mileage_range = sanitize_input(data.get("mileage_range", ""))
+
+    required_fields = [fields["make"], fields["model"], year, fields["fuel_type"], fields["transmission_type"],
+                       condition_input, engine, fields["town"], fields["leasing"]]
+    if any(field is None or str(field).strip() == "" for field in required_fields):
+        return None, "Missing required fields"
 
     try:
-        data = request.json
-        make = sanitize_input(data.get("make", ""))
-        model_name = sanitize_input(data.get("model", ""))
-        year = data.get("year")
-        fuel_type = sanitize_input(data.get("fuel_type", ""))
-        transmission = sanitize_input(data.get("transmission_type", ""))
-        condition_input = sanitize_input(data.get("condition", ""))
-        mileage_range = sanitize_input(data.get("mileage_range", ""))
-        engine = data.get("engine")
-        town = sanitize_input(data.get("town", ""))
-        leasing_input = data.get("leasing", "no leasing")
-
-        print(f"🚗 Prediction request: make={make}, model={model_name}, year={year}, leasing={leasing_input}")
-
-        required_fields = [make, model_name, year, fuel_type, transmission, condition_input, engine, town, leasing_input]
-        if any(field is None or str(field).strip() == "" for field in required_fields):
-            return jsonify({"error": "Missing required fields"}), 400
+        year = int(year)
+        engine = float(engine)
+    except (ValueError, TypeError) as e:
+        return None, f"Invalid data type: {str(e)}"
 
-        try:
-            year = int(year)
-            engine = float(engine)
-        except (ValueError, TypeError) as e:
-            return jsonify({"error": f"Invalid data type: {str(e)}"}), 400
+    fields["condition"] = 'new' if condition_input == 'brand new' else 'used'
 
-        condition = 'new' if condition_input == 'brand new' else 'used'
+    if fields["condition"] == 'used':
+        if not mileage_range:
+            return None, "Mileage range required for used cars"
+        try:
+            if '+' in mileage_range:
+                low = int(mileage_range.split('+')[0])
+                mileage = low + 5000
+            else:
+                low, high = map(int, mileage_range.split('-'))
+                mileage = (low + high) // 2
+        except (ValueError, IndexError) as e:
+            return None, f"Invalid mileage range format: {str(e)}"
+    else:
+        mileage = 0
 
-        if condition == 'used':
-            if not mileage_range:
-                return jsonify({"error": "Mileage range required for used cars"}), 400
-            try:
-                if '+' in mileage_range:
-                    low = int(mileage_range.split('+')[0])
-                    mileage = low + 5000
-                else:
-                    low, high = map(int, mileage_range.split('-'))
-                    mileage = (low + high) // 2
-            except (ValueError, IndexError) as e:
-                return jsonify({"error": f"Invalid mileage range format: {str(e)}"}), 400
-        else:
-            mileage = 0
+    fields.update({
+        "year": year,
+        "engine": engine,
+        "mileage": mileage,
+        "car_age": datetime.now().year - year
+    })
+    return fields, None
 
-        car_age = datetime.now().year - year
+@app.route("/api/predict_price", methods=["POST"])
+def predict_price():
+    price_model = model_registry.get("price_model")
+    if price_model is None or price_schema is None:
+        return jsonify({"error": "Model or feature schema not loaded"}), 500
 
-        try:
-            matched_make = find_closest_match(make, label_encoders['make'].classes_, "make")
-            if matched_make is None:
-                return jsonify({
-                    "error": f"Make '{make}' not found",
-                    "available_makes": list(label_encoders['make'].classes_)[:10]
-                }), 400
-            make_encoded = label_encoders['make'].transform([matched_make])[0]
-
-            matched_model = find_closest_match(model_name, label_encoders['model'].classes_, "model")
-            if matched_model is None:
-                return jsonify({
-                    "error": f"Model '{model_name}' not found"
-                }), 400
-            model_encoded = label_encoders['model'].transform([matched_model])[0]
-
-            matched_fuel = find_closest_match(fuel_type, label_encoders['fuel_type'].classes_, "fuel_type")
-            if matched_fuel is None:
-                return jsonify({
-                    "error": f"Fuel type '{fuel_type}' not found",
-                    "available_fuel_types": list(label_encoders['fuel_type'].classes_)
-                }), 400
-            fuel_encoded = label_encoders['fuel_type'].transform([matched_fuel])[0]
-
-            matched_transmission = find_closest_match(transmission, label_encoders['transmission_type'].classes_, "transmission")
-            if matched_transmission is None:
-                return jsonify({
-                    "error": f"Transmission '{transmission}' not found",
-                    "available_transmissions": list(label_encoders['transmission_type'].classes_)
-                }), 400
-            transmission_encoded = label_encoders['transmission_type'].transform([matched_transmission])[0]
-
-            matched_condition = find_closest_match(condition, label_encoders['condition'].classes_, "condition")
-            if matched_condition is None:
-                return jsonify({
-                    "error": f"Condition '{condition}' not found",
-                    "available_conditions": list(label_encoders['condition'].classes_)
-                }), 400
-            condition_encoded = label_encoders['condition'].transform([matched_condition])[0]
-
-            matched_town = find_closest_match(town, label_encoders['town'].classes_, "town")
-            if matched_town is None:
-                return jsonify({
-                    "error": f"Town '{town}' not found",
-                    "available_towns": list(label_encoders['town'].classes_)[:10]
-                }), 400
-            town_encoded = label_encoders['town'].transform([matched_town])[0]
-
-            matched_leasing = find_closest_match(leasing_input, label_encoders['leasing'].classes_, "leasing")
-            if matched_leasing is None:
-                most_common_leasing = car_data['leasing'].mode().iloc[0] if not car_data.empty else label_encoders['leasing'].classes_[0]
-                matched_leasing = most_common_leasing
-                print(f"⚠️ Using fallback leasing value: {matched_leasing}")
-            leasing_encoded = label_encoders['leasing'].transform([matched_leasing])[0]
-
-            print(f"✅ All matches found and encoded successfully")
+    try:
+        data = request.json
+        fields, error = parse_price_fields(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        matches = {}
+        for col in PRICE_CATEGORICAL_FIELDS:
+            result = match_price_field(col, fields[col])
+            if result is None:
+                return jsonify(match_error(col, fields[col])), 400
+            matches[col] = result
+
+        features = tuple(
+            matches[col].code if col in matches else price_schema.cast(col, fields[col])
+            for col in PRICE_FEATURE_ORDER
+        )
+        version = price_model_version.current()
+        predicted_price = prediction_cache.get(features, version)
 
-        except Exception as e:
-            print(f"❌ Error in encoding: {e}")
-            return jsonify({"error": f"Encoding error: {str(e)}"}), 400
-
-        feature_vector = np.array([
-            make_encoded,
-            model_encoded,
-            float(engine),
-            transmission_encoded,
-            fuel_encoded,
-            float(mileage),
-            town_encoded,
-            leasing_encoded,
-            condition_encoded,
-            int(car_age)
-        ]).reshape(1, -1)
-
-        print(f"📊 Feature vector shape: {feature_vector.shape}")
-        print(f"📊 Feature vector: {feature_vector}")
+        if predicted_price is None:
+            feature_vector = np.array(features, dtype=np.float64).reshape(1, -1)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Price features", extra={"features": features})
 
-        try:
-            predicted_price = price_model.predict(feature_vector)[0]
-            predicted_price = float(predicted_price)
-        except Exception as e:
-            print(f"❌ Error in prediction: {e}")
-            return jsonify({"error": f"Prediction error: {str(e)}"}), 500
+            try:
+                predicted_price = float(price_batcher.predict(feature_vector[0]))
+            except Exception as e:
+                logger.exception("Error in prediction")
+                return jsonify({"error": f"Prediction error: {str(e)}"}), 500
+            prediction_cache.put(features, predicted_price, version)
 
         formatted_price = format_price_lkr(predicted_price)
-        print(f"💰 Predicted price: {predicted_price} -> {formatted_price}")
 
         return jsonify({
             "predicted_price": round(predicted_price, 2),
             "formatted_price": formatted_price,
             "matched_values": {
-                "make": matched_make,
-                "model": matched_model,
-                "fuel_type": matched_fuel,
-                "transmission": matched_transmission,
-                "condition": matched_condition,
-                "town": matched_town
+                "make": matches['make'].value,
+                "model": matches['model'].value,
+                "fuel_type": matches['fuel_type'].value,
+                "transmission": matches['transmission_type'].value,
+                "condition": matches['condition'].value,
+                "town": matches['town'].value
             },
-            "leasing_used": matched_leasing,
-            "car_age": car_age,
-            "mileage_used": mileage,
+            "match_scores": {col: result.score for col, result in matches.items()},
+            "leasing_used": matches['leasing'].value,
+            "car_age": fields["car_age"],
+            "mileage_used": fields["mileage"],
             "warning": "Prediction based on training data - actual market prices may vary"
         })
         
     except ValueError as ve:
-        print(f"❌ ValueError in predict_price: {ve}")
+        logger.warning("ValueError in predict_price: %s", ve)
         return jsonify({"error": f"Value error: {str(ve)}"}), 400
     except Exception as e:
-        print(f"❌ Unexpected error in predict_price: {e}")
+        logger.exception("Unexpected error in predict_price")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+# ----------------- Batch Price Prediction -----------------
+def read_batch_rows():
+    """Rows for a batch request, from a CSV upload/body or a JSON list."""
+    csv_file = request.files.get("file")
+    if csv_file is not None or request.mimetype == "text/csv":
+        stream = csv_file.stream if csv_file is not None else request.stream
+        frame = pd.read_csv(stream, dtype=str, keep_default_na=False)
+        frame.columns = [c.strip() for c in frame.columns]
+        return frame.to_dict("records")
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("cars")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of cars, {\"cars\": [...]}, or a CSV file")
+    return data
+
+def encode_batch_column(col, values):
+    """Encode a whole categorical column, matching each distinct value only once.
+
+    Returns ``(codes, matched)`` aligned with ``values``; unmatched rows get code -1.
+    """
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    matched = [match_price_field(col, value) for value in uniques]
+    unique_codes = np.array([m.code if m is not None else -1 for m in matched], dtype=np.int64)
+    unique_values = np.array([m.value if m is not None else None for m in matched], dtype=object)
+    return unique_codes[inverse], unique_values[inverse]
+
+@app.route("/api/predict_price/batch", methods=["POST"])
+def predict_price_batch():
+    price_model = model_registry.get("price_model")
+    if price_model is None or price_schema is None:
+        return jsonify({"error": "Model or feature schema not loaded"}), 500
+
+    try:
+        rows = read_batch_rows()
+    except Exception as e:
+        return jsonify({"error": f"Invalid batch input: {str(e)}"}), 400
+
+    if not rows:
+        return jsonify({"error": "No cars provided"}), 400
+    if len(rows) > MAX_BATCH_ROWS:
+        return jsonify({"error": f"Batch too large: {len(rows)} rows (max {MAX_BATCH_ROWS})"}), 413
+
+    try:
+        results = [None] * len(rows)
+        parsed = []
+        positions = []
+        for i, row in enumerate(rows):
+            fields, error = parse_price_fields(row) if isinstance(row, dict) else (None, "Row must be an object")
+            if error:
+                results[i] = {"index": i, "error": error}
+            else:
+                parsed.append(fields)
+                positions.append(i)
+
+        if parsed:
+            n = len(parsed)
+            features = np.empty((n, len(PRICE_FEATURE_ORDER)), dtype=np.float64)
+            valid = np.ones(n, dtype=bool)
+            errors = [None] * n
+            matched_columns = {}
+
+            for col in PRICE_CATEGORICAL_FIELDS:
+                values = [fields[col] for fields in parsed]
+                codes, matched = encode_batch_column(col, values)
+                features[:, PRICE_FEATURE_ORDER.index(col)] = codes
+                matched_columns[col] = matched
+                for j in np.flatnonzero(codes < 0):
+                    if valid[j]:
+                        errors[j] = match_error(col, values[j])["error"]
+                    valid[j] = False
+
+            for col in price_schema.numeric:
+                features[:, PRICE_FEATURE_ORDER.index(col)] = price_schema.numeric_column(
+                    col, [fields[col] for fields in parsed])
+
+            prices = np.full(n, np.nan)
+            if valid.any():
+                prices[valid] = price_model.predict(features[valid])
+
+            for j, fields in enumerate(parsed):
+                i = positions[j]
+                if not valid[j]:
+                    results[i] = {"index": i, "error": errors[j]}
+                    continue
+                price = float(prices[j])
+                results[i] = {
+                    "index": i,
+                    "predicted_price": round(price, 2),
+                    "formatted_price": format_price_lkr(price),
+                    "matched_values": {
+                        "make": matched_columns['make'][j],
+                        "model": matched_columns['model'][j],
+                        "fuel_type": matched_columns['fuel_type'][j],
+                        "transmission": matched_columns['transmission_type'][j],
+                        "condition": matched_columns['condition'][j],
+                        "town": matched_columns['town'][j]
+                    },
+                    "leasing_used": matched_columns['leasing'][j],
+                    "car_age": fields["car_age"],
+                    "mileage_used": fields["mileage"]
+                }
+
+        failed = sum(1 for r in results if "error" in r)
+        return jsonify({
+            "results": results,
+            "total": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "warning": "Prediction based on training data - actual market prices may vary"
+        })
+    except Exception as e:
+        logger.exception("Unexpected error in predict_price_batch")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 # ----------------- API Endpoints -----------------
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
+count_cache = CountCache(ttl=float(os.getenv("COUNT_CACHE_TTL", 60)))
+
+# Seller join and card fields shared by the browse and search endpoints
+LISTING_CARD_STAGES = [
+    {"$lookup": {
+        "from": "users",
+        "localField": "seller_id",
+        "foreignField": "_id",
+        "as": "seller"
+    }},
+    {"$unwind": "$seller"},
+    {"$project": {
+        "_id": 1,
+        "title": 1,
+        "description": 1,
+        "price": 1,
+        "make": 1,
+        "model": 1,
+        "year": 1,
+        "mileage": 1,
+        "condition": 1,
+        "images": 1,
+        "status": 1,
+        "created_at": 1,
+        "updated_at": 1,
+        "views": 1,
+        "unique_views": 1,
+        "score": 1,
+        "seller_id": "$seller._id",
+        "sellerBusinessName": "$seller.businessName",
+        "sellerContact": {"$ifNull": ["$seller.businessPhone", "$seller.phone", ""]}
+    }}
+]
+
+
+class InvalidQuery(ValueError):
+    pass
+
+def viewer_is_admin(session):
+    return "user_id" in session and session.get("role") == "admin"
+
+def cars_page_plan(args, is_admin):
+    """Count query, aggregation pipeline and paging state for a /api/cars request.
+
+    Shared by the sync view and the async one in asgi.py; raises
+    ``InvalidQuery``/``InvalidCursor`` for bad parameters.
+    """
+    limit = max(1, min(int(args.get("limit", 10)), MAX_PAGE_SIZE))
+    cursor = args.get("cursor", "").strip()
+    page = args.get("page")
+    search = args.get("search", "").strip()
+    min_price = args.get("minPrice", None)
+    max_price = args.get("maxPrice", None)
+
+    query = {}
+    if not is_admin:
+        query["status"] = "approved"
+
+    if search:
+        query["$text"] = {"$search": search}
+
+    if min_price or max_price:
+        query["price"] = {}
+        if min_price:
+            try:
+                query["price"]["$gte"] = float(min_price)
+            except ValueError:
+                raise InvalidQuery("Invalid minPrice value")
+        if max_price:
+            try:
+                query["price"]["$lte"] = float(max_price)
+            except ValueError:
+                raise InvalidQuery("Invalid maxPrice value")
+
+    # Page through (created_at, _id) so page N costs the same as page 1;
+    # ?page= is still accepted but has to skip.
+    match = query
+    if cursor:
+        match = {"$and": [query, keyset_match(cursor)]}
+
+    pipeline = [{"$match": match}, {"$sort": keyset_sort()}]
+    if page and not cursor:
+        page = max(1, int(page))
+        pipeline.append({"$skip": (page - 1) * limit})
+    else:
+        page = None
+    # One extra row tells us whether another page exists; the seller
+    # join only runs for rows actually returned.
+    pipeline += [
+        {"$limit": limit + 1},
+        *LISTING_CARD_STAGES
+    ]
+    return {
+        "query": query,
+        "pipeline": pipeline,
+        "limit": limit,
+        "page": page,
+        "include_total": args.get("include_total", "true").lower() != "false"
+    }
+
+def cars_page_response(cars, plan, total=None):
+    limit = plan["limit"]
+    has_more = len(cars) > limit
+    cars = cars[:limit]
+
+    response = {
+        "cars": cars,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(cars[-1]) if has_more and cars else None
+    }
+    if total is not None:
+        # Approximate: served from a short-lived per-query counter
+        response["total"] = total
+        response["pages"] = (total + limit - 1) // limit
+    if plan["page"]:
+        response["page"] = plan["page"]
+    return response
+
 @app.route("/api/cars", methods=["GET"])
 def get_cars():
     try:
-        limit = int(request.args.get("limit", 10))
-        page = int(request.args.get("page", 1))
-        search = request.args.get("search", "").strip()
-        min_price = request.args.get("minPrice", None)
-        max_price = request.args.get("maxPrice", None)
-        skip = (page - 1) * limit
-
-        query = {}
-        if "user_id" not in session or session.get("role") != "admin":
-            query["status"] = "approved"
-
-        if search:
-            query["$or"] = [
-                {"make": {"$regex": search, "$options": "i"}},
-                {"model": {"$regex": search, "$options": "i"}},
-                {"title": {"$regex": search, "$options": "i"}}
-            ]
-
-        if min_price or max_price:
-            query["price"] = {}
-            if min_price:
-                try:
-                    query["price"]["$gte"] = float(min_price)
-                except ValueError:
-                    return jsonify({"error": "Invalid minPrice value"}), 400
-            if max_price:
-                try:
-                    query["price"]["$lte"] = float(max_price)
-                except ValueError:
-                    return jsonify({"error": "Invalid maxPrice value"}), 400
-
-        pipeline = [
-            {"$match": query},
-            {"$lookup": {
-                "from": "users",
-                "localField": "seller_id",
-                "foreignField": "_id",
-                "as": "seller"
-            }},
-            {"$unwind": "$seller"},
-            {"$project": {
-                "_id": 1,
-                "title": 1,
-                "description": 1,
-                "price": 1,
-                "make": 1,
-                "model": 1,
-                "year": 1,
-                "mileage": 1,
-                "condition": 1,
-                "images": 1,
-                "status": 1,
-                "created_at": 1,
-                "updated_at": 1,
-                "views": 1,
-                "seller_id": "$seller._id",
-                "sellerBusinessName": "$seller.businessName",
-                "sellerContact": {"$ifNull": ["$seller.businessPhone", "$seller.phone", ""]}
-            }},
-            {"$skip": skip},
-            {"$limit": limit}
-        ]
-
-        cars = list(cars_collection.aggregate(pipeline))
-        total = cars_collection.count_documents(query)
-
-        serialized_cars = serialize_objectid(cars)
+        plan = cars_page_plan(request.args, viewer_is_admin(session))
+        cars = list(browse_cars.aggregate(plan["pipeline"]))
+        total = count_cache.count(browse_cars, plan["query"]) if plan["include_total"] else None
+        return jsonify(cars_page_response(cars, plan, total))
+    except (InvalidQuery, InvalidCursor) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error fetching cars: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify({
-            "cars": serialized_cars,
-            "total": total,
-            "page": page,
-            "pages": (total + limit - 1) // limit
-        })
+def search_plan(args, is_admin):
+    """Faceted search pipeline for a /api/cars/search request, with its page and limit."""
+    text = args.get("q", "").strip()
+    limit = max(1, min(int(args.get("limit", 10)), MAX_PAGE_SIZE))
+    page = max(1, int(args.get("page", 1)))
+    year_band = args.get("year_band")
+    price_band = args.get("price_band")
+
+    base_query = {}
+    if not is_admin:
+        base_query["status"] = "approved"
+
+    try:
+        filters = build_filters(
+            make=args.get("make", "").strip() or None,
+            condition=args.get("condition", "").strip() or None,
+            year_band=int(year_band) if year_band else None,
+            price_band=int(price_band) if price_band else None
+        )
+    except ValueError as e:
+        raise InvalidQuery(str(e))
+
+    pipeline = build_search_pipeline(
+        text, base_query, filters,
+        skip=(page - 1) * limit,
+        limit=limit,
+        result_stages=LISTING_CARD_STAGES
+    )
+    return pipeline, page, limit
+
+def search_response(raw, page, limit):
+    result = format_facets(raw)
+    return {
+        "cars": result["results"],
+        "total": result["total"],
+        "page": page,
+        "pages": (result["total"] + limit - 1) // limit,
+        "facets": result["facets"]
+    }
+
+@app.route("/api/cars/search", methods=["GET"])
+def search_cars():
+    try:
+        pipeline, page, limit = search_plan(request.args, viewer_is_admin(session))
+        raw = next(browse_cars.aggregate(pipeline), {})
+        return jsonify(search_response(raw, page, limit))
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error fetching cars: {str(e)}")
+        logger.error("Error searching cars: %s", e)
         return jsonify({"error": str(e)}), 500
 
+BRAND_FEATURE_MAPPING = {
+    'condition': 'Condition',
+    'gear': 'Gear',
+    'fuel_type': 'Fuel Type',
+    'yom': 'YOM',
+    'engine': 'Engine (cc)',
+    'price': 'Price'
+}
+BRAND_FUEL_TYPES = {
+    'petrol': 'Petrol',
+    'diesel': 'Diesel',
+    'hybrid': 'Hybrid',
+    'electric': 'Electric'
+}
+# Features the form does not ask for
+BRAND_DEFAULTS = {'Millage(KM)': 0, 'Town': 'Colombo', 'Leasing': 'No Leasing'}
+
+def map_brand_input(data):
+    """Classifier feature values for one request; ``(values, None)`` or ``(None, error)``."""
+    mapped_data = {}
+    for frontend_name, backend_name in BRAND_FEATURE_MAPPING.items():
+        if frontend_name in data:
+            value = data[frontend_name]
+            if frontend_name == 'condition':
+                value = 'USED' if str(value).lower() == 'used' else 'NEW'
+            elif frontend_name == 'gear':
+                value = 'Automatic' if str(value).lower() == 'auto' else 'Manual'
+            elif frontend_name == 'fuel_type':
+                value = BRAND_FUEL_TYPES.get(str(value).lower(), str(value).title())
+            elif frontend_name == 'price':
+                try:
+                    value = float(value) * 100000
+                except (TypeError, ValueError):
+                    return None, {"error": "Price must be a number"}
+            mapped_data[backend_name] = value
+    mapped_data.update(BRAND_DEFAULTS)
+    return mapped_data, None
+
 @app.route("/api/predict_brand_model", methods=["POST"])
 def predict_brand_model_api():
     if request.method == "OPTIONS":
         return ("", 204)
 
-    if multi_target_model is None or not classifier_label_encoders:
+    classifier = get_brand_classifier()
+    if classifier is None:
         return jsonify({"error": "Prediction model not available. Please try again later."}), 503
 
     try:
@@ -643,91 +889,48 @@ def predict_brand_model_api():
         if not data:
             return jsonify({"error": "No input data provided"}), 400
 
-        feature_mapping = {
-            'condition': 'Condition',
-            'gear': 'Gear',
-            'fuel_type': 'Fuel Type',
-            'yom': 'YOM',
-            'engine': 'Engine (cc)',
-            'price': 'Price'
-        }
+        # A list, or {"cars": [...]}, is predicted as one batch
+        if isinstance(data, dict) and "cars" not in data:
+            values, error = map_brand_input(data)
+            if error is None:
+                row, error = classifier.encode(values)
+            if error:
+                return jsonify(error), 400
+            return jsonify(classifier.describe(brand_batcher.predict(row)))
+
+        rows = data.get("cars") if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not rows:
+            return jsonify({"error": "No cars provided"}), 400
+        if len(rows) > MAX_BATCH_ROWS:
+            return jsonify({"error": f"Batch too large: {len(rows)} rows (max {MAX_BATCH_ROWS})"}), 413
+
+        results = [None] * len(rows)
+        encoded = []
+        positions = []
+        for i, item in enumerate(rows):
+            values, error = map_brand_input(item) if isinstance(item, dict) else (None, {"error": "Row must be an object"})
+            if error is None:
+                row, error = classifier.encode(values)
+            if error:
+                results[i] = {"index": i, **error}
+            else:
+                encoded.append(row)
+                positions.append(i)
 
-        mapped_data = {}
-        for frontend_name, backend_name in feature_mapping.items():
-            if frontend_name in data:
-                value = data[frontend_name]
-                if frontend_name == 'condition':
-                    value = 'USED' if value.lower() == 'used' else 'NEW'
-                elif frontend_name == 'gear':
-                    value = 'Automatic' if value.lower() == 'auto' else 'Manual'
-                elif frontend_name == 'fuel_type':
-                    fuel_map = {
-                        'petrol': 'Petrol',
-                        'diesel': 'Diesel',
-                        'hybrid': 'Hybrid',
-                        'electric': 'Electric'
-                    }
-                    value = fuel_map.get(value.lower(), value.title())
-                elif frontend_name == 'price':
-                    try:
-                        value = float(value) * 100000
-                    except ValueError:
-                        return jsonify({"error": "Price must be a number"}), 400
-                mapped_data[backend_name] = value
-
-        mapped_data['Millage(KM)'] = 0
-        mapped_data['Town'] = 'Colombo'
-        mapped_data['Leasing'] = 'No Leasing'
-
-        input_df = pd.DataFrame([mapped_data])
-
-        for col in input_df.columns:
-            if col in classifier_label_encoders:
-                le = classifier_label_encoders[col]
-                try:
-                    if col in ['YOM', 'Engine (cc)', 'Price', 'Millage(KM)']:
-                        input_df[col] = input_df[col].astype(float)
-                    else:
-                        input_df[col] = le.transform(input_df[col].astype(str))
-                except ValueError as e:
-                    return jsonify({
-                        "error": f"Input value for '{col}' is invalid: {str(e)}",
-                        "field": col,
-                        "value": str(input_df[col].iloc[0]),
-                        "available_values": le.classes_.tolist()
-                    }), 400
-
-        predicted_labels = multi_target_model.predict(input_df)[0]
-        predicted_probs = multi_target_model.predict_proba(input_df)
-
-        brand_le = classifier_label_encoders['Brand']
-        model_le = classifier_label_encoders['Model']
-        predicted_brand = brand_le.inverse_transform([predicted_labels[0]])[0]
-        predicted_model = model_le.inverse_transform([predicted_labels[1]])[0]
-
-        brand_prob = max(predicted_probs[0][0])
-        model_prob = max(predicted_probs[1][0])
-
-        brand_classes = brand_le.classes_
-        model_classes = model_le.classes_
-        brand_top_k = [{"brand": brand_classes[i], "prob": float(predicted_probs[0][0][i])} 
-                       for i in predicted_probs[0][0].argsort()[::-1][:3]]
-        model_top_k = [{"model": model_classes[i], "prob": float(predicted_probs[1][0][i])} 
-                       for i in predicted_probs[1][0].argsort()[::-1][:3]]
+        if encoded:
+            for i, row_probs in zip(positions, classifier.predict_rows(np.vstack(encoded))):
+                results[i] = {"index": i, **classifier.describe(row_probs)}
 
+        failed = sum(1 for r in results if "error" in r)
         return jsonify({
-            "brand": predicted_brand,
-            "brand_confidence": float(brand_prob),
-            "brand_top_k": brand_top_k,
-            "model": predicted_model,
-            "model_confidence": float(model_prob),
-            "model_top_k": model_top_k
+            "results": results,
+            "total": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed
         })
 
     except Exception as e:
-        print(f"❌ Error in predict_brand_model_api: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in predict_brand_model_api")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 # ----------------- Authentication -----------------
@@ -765,7 +968,7 @@ def signup():
         })
         return jsonify({"message": "Account created", "user_id": str(result.inserted_id), "authenticated": True}), 201
     except Exception as e:
-        print(f"Error in signup: {str(e)}")
+        logger.error("Error in signup: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/auth/login", methods=["POST"])
@@ -798,7 +1001,7 @@ def login():
             "authenticated": True
         })
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route("/api/auth/logout", methods=["POST"])
@@ -822,17 +1025,32 @@ def get_current_user():
         "authenticated": True
     })
 
+# ----------------- Health -----------------
+@app.route("/api/health", methods=["GET"])
+def health():
+    # Availability is checked on disk so every worker agrees, whether or not
+    # it has loaded the models yet
+    models = {
+        "price_model": model_registry.available("price_model"),
+        "brand_model": model_registry.available("brand_model")
+    }
+    return jsonify({
+        "status": "ok" if all(models.values()) else "degraded",
+        "models": models,
+        "fallback_model": fallback_trainer.status()
+    })
+
 # ----------------- Debug Endpoints -----------------
 @app.route("/api/debug/encoders", methods=["GET"])
 def debug_encoders():
-    if not label_encoders:
+    if price_schema is None:
         return jsonify({"error": "Encoders not loaded"}), 500
     
     debug_info = {}
-    for encoder_name, encoder in label_encoders.items():
+    for encoder_name, classes in price_schema.categories.items():
         debug_info[encoder_name] = {
-            "classes": list(encoder.classes_)[:20],
-            "total_classes": len(encoder.classes_)
+            "classes": classes[:20],
+            "total_classes": len(classes)
         }
     
     return jsonify(debug_info)
@@ -840,15 +1058,52 @@ def debug_encoders():
 @app.route("/api/debug/model_info", methods=["GET"])
 def debug_model_info():
     return jsonify({
-        "model_loaded": price_model is not None,
-        "encoders_loaded": len(label_encoders) if label_encoders else 0,
+        "model_loaded": model_registry.get("price_model") is not None,
+        "encoders_loaded": len(price_schema.categories) if price_schema else 0,
+        "feature_schema": {
+            "created_at": price_schema.created_at,
+            "model_sha256": price_schema.model_sha256
+        } if price_schema else None,
         "dataset_loaded": not car_data.empty,
         "dataset_shape": car_data.shape if not car_data.empty else None,
-        "available_encoders": list(label_encoders.keys()) if label_encoders else []
+        "available_encoders": list(price_schema.categories) if price_schema else [],
+        "models": model_registry.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "inference_batching": {"price": price_batcher.stats(), "brand": brand_batcher.stats()},
+        "view_counter": view_counter.stats(),
+        "vehicle_cache": vehicle_cache.stats()
     })
 
+@app.route("/api/debug/db_pool", methods=["GET"])
+@login_required
+def debug_db_pool():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify({
+        "options": pool_options(),
+        "browse_read_preference": browse_cars.read_preference.document,
+        "browse_read_concern": browse_cars.read_concern.document,
+        "metrics": pool_metrics.stats()
+    })
+
+@app.route("/api/debug/indexes", methods=["GET"])
+@login_required
+def debug_indexes():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+    try:
+        return jsonify({
+            "indexes": index_report(db),
+            "query_plans": explain_hot_queries(db)
+        })
+    except Exception as e:
+        logger.error("Error checking indexes: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/debug/classifier_values", methods=["GET"])
 def debug_classifier_values():
+    classifier = get_brand_classifier()
+    classifier_label_encoders = classifier.encoders if classifier else {}
     if not classifier_label_encoders:
         return jsonify({"error": "Classifier encoders not loaded"}), 500
     
@@ -907,10 +1162,51 @@ def create_seller():
         return jsonify({"message": "Seller created successfully", "user_id": str(result.inserted_id)}), 201
 
     except Exception as e:
-        print(f"Error creating seller: {str(e)}")
+        logger.error("Error creating seller: %s", e)
         return jsonify({"error": str(e)}), 500
 
 # ----------------- Seller Listings Endpoints -----------------
+# ?format=ndjson|csv streams these tables instead of building one JSON array
+LISTING_EXPORT_FIELDS = ["_id", "title", "price", "make", "model", "year", "mileage", "condition",
+                         "status", "views", "images", "created_at", "updated_at"]
+LISTING_EXPORT_PROJECTION = {field: 1 for field in LISTING_EXPORT_FIELDS}
+PENDING_EXPORT_FIELDS = LISTING_EXPORT_FIELDS + ["sellerName", "sellerBusinessName", "sellerContact"]
+USER_EXPORT_FIELDS = ["_id", "username", "email", "phone", "created_at", "isVerified"]
+USER_EXPORT_PROJECTION = {"username": 1, "email": 1, "phone": 1, "businessPhone": 1, "created_at": 1, "isVerified": 1}
+
+def export_format():
+    fmt = request.args.get("format", "").lower()
+    return fmt if fmt in EXPORT_FORMATS else None
+
+# The listing is inserted as "processing" before the request returns, and
+# its images are moved into place on a worker that then makes it "pending".
+# The job state lives on the listing, so any worker can report it; one
+# still processing after LISTING_JOB_TIMEOUT seconds was lost with its worker.
+listing_writer = ThreadPoolExecutor(max_workers=int(os.getenv("LISTING_WORKERS", 4)),
+                                    thread_name_prefix="listing-writer")
+LISTING_JOB_TIMEOUT = int(os.getenv("LISTING_JOB_TIMEOUT", 300))
+
+def persist_listing(listing_id, spools):
+    try:
+        for spool in spools:
+            image_derivatives.submit(spool.finalize(app.config['UPLOAD_FOLDER']))
+        cars_collection.update_one(
+            {"_id": listing_id, "status": "processing"},
+            {"$set": {"status": "pending", "updated_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        logger.error("Error persisting listing %s: %s", listing_id, e)
+        for spool in spools:
+            spool.discard()
+        try:
+            cars_collection.update_one(
+                {"_id": listing_id, "status": "processing"},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error("Error marking listing %s failed: %s", listing_id, e)
+    count_cache.invalidate(cars_collection.name)
+
 @app.route("/api/listings", methods=["POST"])
 @login_required
 def create_listing():
@@ -934,16 +1230,19 @@ def create_listing():
         year = int(year)
         mileage = int(mileage) if mileage and condition == "used" else None
 
-        images = []
-        if 'images' in request.files:
-            for file in request.files.getlist('images'):
-                if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
-                    images.append(f"/uploads/{filename}")
+        # Files were already streamed, hashed and sniffed while the body was
+        # parsed; anything that is not a JPEG/PNG was dropped on the way in
+        spools = []
+        rejected = []
+        for file in request.files.getlist('images'):
+            if file.stream.valid and len(spools) < MAX_IMAGES_PER_LISTING:
+                file.stream.claim()
+                spools.append(file.stream)
+            elif file.filename:
+                rejected.append(file.filename)
 
         listing = {
+            "_id": ObjectId(),
             "title": title,
             "description": description,
             "price": price,
@@ -952,19 +1251,59 @@ def create_listing():
             "year": year,
             "mileage": mileage,
             "condition": condition,
-            "images": images,
-            "status": "pending",
+            "images": [f"/uploads/{spool.name}" for spool in spools],
+            "status": "processing",
             "seller_id": ObjectId(session["user_id"]),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
             "views": 0
         }
 
-        result = cars_collection.insert_one(listing)
-        return jsonify({"message": "Listing created", "id": str(result.inserted_id)}), 201
+        try:
+            cars_collection.insert_one(listing)
+        except Exception:
+            for spool in spools:
+                spool.discard()
+            raise
+        count_cache.invalidate(cars_collection.name)
+        listing_writer.submit(persist_listing, listing["_id"], spools)
+        return jsonify({
+            "message": "Listing accepted",
+            "id": str(listing["_id"]),
+            "status": "processing",
+            "images": listing["images"],
+            "rejected_files": rejected
+        }), 202
+
+    except RequestEntityTooLarge as e:
+        return jsonify({"error": e.description}), 413
+    except Exception as e:
+        logger.error("Error creating listing: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/listings/<listing_id>/status", methods=["GET"])
+@login_required
+def get_listing_status(listing_id):
+    if session.get("role") != "seller":
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        listing = cars_collection.find_one(
+            {"_id": ObjectId(listing_id), "seller_id": ObjectId(session["user_id"])},
+            {"status": 1, "error": 1, "created_at": 1}
+        )
+        if not listing:
+            return jsonify({"error": "Listing not found"}), 404
+        if listing["status"] == "processing":
+            if datetime.utcnow() - listing["created_at"] < timedelta(seconds=LISTING_JOB_TIMEOUT):
+                return jsonify({"status": "processing"})
+            return jsonify({"status": "failed", "error": "Listing was not saved, please submit it again"})
+        if listing["status"] == "failed":
+            return jsonify({"status": "failed", "error": listing.get("error", "Failed to save listing")})
+        return jsonify({"status": "stored", "listing_status": listing["status"]})
 
     except Exception as e:
-        print(f"Error creating listing: {str(e)}")
+        logger.error("Error fetching listing status: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/my-listings", methods=["GET"])
@@ -975,10 +1314,16 @@ def get_my_listings():
 
     try:
         seller_id = ObjectId(session["user_id"])
+        fmt = export_format()
+        if fmt:
+            cursor = cars_collection.find(
+                {"seller_id": seller_id}, LISTING_EXPORT_PROJECTION, batch_size=EXPORT_BATCH_SIZE
+            ).sort("created_at", -1)
+            return export_response(cursor, fmt, LISTING_EXPORT_FIELDS, "my-listings", app.json.dumps)
         listings = list(cars_collection.find({"seller_id": seller_id}))
-        return jsonify(serialize_objectid(listings))
+        return jsonify(listings)
     except Exception as e:
-        print(f"Error fetching listings: {str(e)}")
+        logger.error("Error fetching listings: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/listings/<id>", methods=["DELETE"])
@@ -994,9 +1339,11 @@ def delete_listing(id):
             return jsonify({"error": "Listing not found or not owned"}), 404
 
         cars_collection.delete_one({"_id": obj_id})
+        count_cache.invalidate(cars_collection.name)
+        vehicle_cache.invalidate(id)
         return jsonify({"message": "Listing deleted"})
     except Exception as e:
-        print(f"Error deleting listing: {str(e)}")
+        logger.error("Error deleting listing: %s", e)
         return jsonify({"error": str(e)}), 400
 
 # ----------------- Admin Endpoints -----------------
@@ -1010,10 +1357,8 @@ def get_users(userType):
         if userType not in ["buyer", "seller"]:
             return jsonify({"error": "Invalid user type. Must be 'buyer' or 'seller'"}), 400
 
-        users = list(users_collection.find({"role": userType}))
-
-        formatted_users = [
-            {
+        def format_user(user):
+            return {
                 "_id": str(user["_id"]),
                 "username": user.get("username", ""),
                 "email": user.get("email", ""),
@@ -1021,14 +1366,16 @@ def get_users(userType):
                 "created_at": user.get("created_at", "").isoformat() if user.get("created_at") else "",
                 "isVerified": user.get("isVerified", False) if userType == "seller" else False
             }
-            for user in users
-        ]
 
-        print(f"Fetching users with role: {userType}")
-        print(f"Found {len(users)} users")
-        return jsonify(formatted_users)
+        cursor = users_collection.find({"role": userType}, USER_EXPORT_PROJECTION, batch_size=EXPORT_BATCH_SIZE)
+        fmt = export_format()
+        if fmt:
+            rows = (format_user(user) for user in cursor)
+            return export_response(rows, fmt, USER_EXPORT_FIELDS, f"{userType}s", app.json.dumps)
+
+        return jsonify([format_user(user) for user in cursor])
     except Exception as e:
-        print(f"Error fetching {userType} users: {str(e)}")
+        logger.error("Error fetching %s users: %s", userType, e)
         return jsonify({"error": f"Failed to fetch {userType} users: {str(e)}"}), 500
 
 @app.route("/api/admin/users/<userId>", methods=["DELETE"])
@@ -1044,14 +1391,47 @@ def delete_user(userId):
             return jsonify({"error": "User not found or not a buyer/seller"}), 404
 
         cars_collection.delete_many({"seller_id": obj_id})
+        count_cache.invalidate(cars_collection.name)
+        vehicle_cache.invalidate_where(lambda vehicle: vehicle.get("seller_id") == obj_id)
+        remove_buyer_ratings(db, obj_id)
         ratings_collection.delete_many({"$or": [{"seller_id": obj_id}, {"buyer_id": obj_id}]})
 
         users_collection.delete_one({"_id": obj_id})
         return jsonify({"message": f"{user['role'].capitalize()} account deleted successfully"})
     except Exception as e:
-        print(f"Error deleting user: {str(e)}")
+        logger.error("Error deleting user: %s", e)
         return jsonify({"error": f"Failed to delete user: {str(e)}"}), 500
 
+PENDING_LISTINGS_PIPELINE = [
+    {"$match": {"status": "pending"}},
+    {"$lookup": {
+        "from": "users",
+        "localField": "seller_id",
+        "foreignField": "_id",
+        "as": "seller"
+    }},
+    {"$unwind": "$seller"},
+    {"$project": {
+        "_id": 1,
+        "title": 1,
+        "description": 1,
+        "price": 1,
+        "make": 1,
+        "model": 1,
+        "year": 1,
+        "mileage": 1,
+        "condition": 1,
+        "images": 1,
+        "status": 1,
+        "created_at": 1,
+        "updated_at": 1,
+        "views": 1,
+        "sellerName": "$seller.username",
+        "sellerBusinessName": "$seller.businessName",
+        "sellerContact": {"$ifNull": ["$seller.businessPhone", "$seller.phone", ""]}
+    }}
+]
+
 @app.route("/api/admin/pending-listings", methods=["GET"])
 @login_required
 def get_pending_listings():
@@ -1059,39 +1439,15 @@ def get_pending_listings():
         return jsonify({"error": "Unauthorized"}), 403
 
     try:
-        pipeline = [
-            {"$match": {"status": "pending"}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "seller_id",
-                "foreignField": "_id",
-                "as": "seller"
-            }},
-            {"$unwind": "$seller"},
-            {"$project": {
-                "_id": 1,
-                "title": 1,
-                "description": 1,
-                "price": 1,
-                "make": 1,
-                "model": 1,
-                "year": 1,
-                "mileage": 1,
-                "condition": 1,
-                "images": 1,
-                "status": 1,
-                "created_at": 1,
-                "updated_at": 1,
-                "views": 1,
-                "sellerName": "$seller.username",
-                "sellerBusinessName": "$seller.businessName",
-                "sellerContact": {"$ifNull": ["$seller.businessPhone", "$seller.phone", ""]}
-            }}
-        ]
+        pipeline = PENDING_LISTINGS_PIPELINE
+        fmt = export_format()
+        if fmt:
+            cursor = cars_collection.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+            return export_response(cursor, fmt, PENDING_EXPORT_FIELDS, "pending-listings", app.json.dumps)
         listings = list(cars_collection.aggregate(pipeline))
-        return jsonify(serialize_objectid(listings))
+        return jsonify(listings)
     except Exception as e:
-        print(f"Error fetching pending listings: {str(e)}")
+        logger.error("Error fetching pending listings: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/admin/listings/<id>/approve", methods=["POST"])
@@ -1108,9 +1464,11 @@ def approve_listing(id):
         )
         if result.modified_count == 0:
             return jsonify({"error": "Listing not found or not pending"}), 404
+        count_cache.invalidate(cars_collection.name)
+        vehicle_cache.invalidate(id)
         return jsonify({"message": "Listing approved"})
     except Exception as e:
-        print(f"Error approving listing: {str(e)}")
+        logger.error("Error approving listing: %s", e)
         return jsonify({"error": str(e)}), 400
 
 @app.route("/api/admin/listings/<id>/reject", methods=["POST"])
@@ -1127,9 +1485,11 @@ def reject_listing(id):
         )
         if result.modified_count == 0:
             return jsonify({"error": "Listing not found or not pending"}), 404
+        count_cache.invalidate(cars_collection.name)
+        vehicle_cache.invalidate(id)
         return jsonify({"message": "Listing rejected"})
     except Exception as e:
-        print(f"Error rejecting listing: {str(e)}")
+        logger.error("Error rejecting listing: %s", e)
         return jsonify({"error": str(e)}), 400
 
 # ----------------- Profile Update -----------------
@@ -1155,18 +1515,108 @@ def update_profile():
         )
         if result.modified_count == 0:
             return jsonify({"error": "No changes made"}), 404
+        # Seller snapshots embedded in cached vehicle details are now stale
+        vehicle_cache.invalidate_where(lambda vehicle: str(vehicle.get("seller_id")) == session["user_id"])
 
         return jsonify({"message": "Profile updated"})
     except Exception as e:
-        print(f"Error updating profile: {str(e)}")
+        logger.error("Error updating profile: %s", e)
         return jsonify({"error": str(e)}), 500
 
 # ----------------- Serve Uploaded Files -----------------
+# UPLOADS_SENDFILE=nginx hands the file to nginx with X-Accel-Redirect
+# (internal location UPLOADS_ACCEL_PREFIX aliased to the upload folder);
+# UPLOADS_SENDFILE=apache uses X-Sendfile. Otherwise Werkzeug streams it
+# through wsgi.file_wrapper, which gunicorn turns into sendfile().
+UPLOADS_SENDFILE = os.getenv("UPLOADS_SENDFILE", "").lower()
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+IMMUTABLE_MAX_AGE = 31536000
+# Served while a requested variant is still being generated
+PENDING_VARIANT_MAX_AGE = 60
+
+def upload_caching(filename, path, pending):
+    """(etag, max_age, immutable) for serving ``path`` in answer to ``filename``."""
+    if not is_content_addressed(filename):
+        return None, app.get_send_file_max_age(filename), False
+    if pending:
+        # Fallback to the original; the same request (?w= or Width) will be
+        # served a variant once it exists
+        return os.path.basename(path), PENDING_VARIANT_MAX_AGE, False
+    return os.path.basename(path), IMMUTABLE_MAX_AGE, True
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # ?w= (or a Width client hint) picks the smallest resized variant that fits;
+    # WebP is preferred when the browser accepts it.
+    query_width = request.args.get("w", type=int)
+    width = query_width or request.headers.get("Width", type=int)
+    accept_webp = "image/webp" in request.headers.get("Accept", "")
+    path, pending = image_derivatives.best_variant(filename, width, accept_webp)
+    etag, max_age, immutable = upload_caching(filename, path, pending)
+
+    if UPLOADS_SENDFILE in ("nginx", "apache"):
+        full_path = safe_join(app.config['UPLOAD_FOLDER'], path)
+        if full_path is None or not os.path.isfile(full_path):
+            return jsonify({"error": "File not found"}), 404
+        response = app.response_class(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+        if UPLOADS_SENDFILE == "nginx":
+            response.headers["X-Accel-Redirect"] = UPLOADS_ACCEL_PREFIX + path
+        else:
+            response.headers["X-Sendfile"] = os.path.abspath(full_path)
+        if etag:
+            response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        # conditional=True answers If-None-Match and Range requests (206)
+        response = send_from_directory(
+            app.config['UPLOAD_FOLDER'], path,
+            conditional=True,
+            etag=etag if etag else True,
+            max_age=max_age
+        )
+        response.cache_control.public = True
+
+    if immutable:
+        response.cache_control.immutable = True
+    if not query_width:
+        # Without ?w= the Width header picks the variant, so shared caches
+        # must key on it too
+        response.vary.add("Width")
+    if width:
+        response.vary.add("Accept")
+    return response
+
+# ----------------- Vehicle Detail Cache -----------------
+# Read-through cache of serialized vehicle details. Writes in this process
+# invalidate entries explicitly; the TTL bounds staleness from other workers
+# and of the view counts. Misses read the primary: a lagging secondary could
+# refill an entry just invalidated with the state from before the write.
+vehicle_cache = TTLCache(
+    maxsize=int(os.getenv("VEHICLE_CACHE_SIZE", 2048)),
+    ttl=float(os.getenv("VEHICLE_CACHE_TTL", 30))
+)
+
+# ----------------- Listing View Counter -----------------
+# Views are merged in memory and written with one bulk_write per flush
+view_counter = ViewCounter(
+    cars_collection,
+    flush_interval=float(os.getenv("VIEW_FLUSH_INTERVAL_MS", 1000)) / 1000,
+    max_events=int(os.getenv("VIEW_FLUSH_MAX_EVENTS", 500)),
+    dedup=os.getenv("VIEW_DEDUP", "true").lower() == "true",
+    dedup_capacity=int(os.getenv("VIEW_DEDUP_CAPACITY", 1000000)),
+    dedup_window=float(os.getenv("VIEW_DEDUP_WINDOW", 86400)),
+    logger=logger
+)
 
 # ----------------- Buyer Rating Endpoint -----------------
+RATING_SUMMARY_FIELDS = {"rating_sum": 1, "rating_count": 1, "rating_hist": 1, "avg_rating": 1, "total_ratings": 1}
+
+# Repairs drift in the incremental rating counters; 0 disables it
+RATING_RECONCILE_INTERVAL = float(os.getenv("RATING_RECONCILE_INTERVAL", 3600))
+if RATING_RECONCILE_INTERVAL > 0:
+    start_reconciler(db, RATING_RECONCILE_INTERVAL, logger=logger)
+
 @app.route("/api/rate-seller", methods=["POST"])
 @login_required
 def rate_seller():
@@ -1198,81 +1648,133 @@ def rate_seller():
         }
 
         ratings_collection.insert_one(rating_doc)
-
-        pipeline = [
-            {"$match": {"seller_id": ObjectId(seller_id)}},
-            {"$group": {"_id": "$seller_id", "avg_rating": {"$avg": "$rating"}, "total_ratings": {"$sum": 1}}}
-        ]
-        avg_result = list(ratings_collection.aggregate(pipeline))
-        if avg_result:
-            avg_rating = avg_result[0]["avg_rating"]
-            total_ratings = avg_result[0]["total_ratings"]
-            users_collection.update_one(
-                {"_id": ObjectId(seller_id)},
-                {"$set": {"avg_rating": avg_rating, "total_ratings": total_ratings}}
-            )
+        record_rating(users_collection, ObjectId(seller_id), rating)
 
         return jsonify({"message": "Rating submitted successfully"})
     except Exception as e:
-        print(f"Error submitting rating: {str(e)}")
+        logger.error("Error submitting rating: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def seller_ratings_plan(seller_obj_id, args):
+    """Aggregation pipeline and page size for one page of a seller's ratings."""
+    limit = max(1, min(int(args.get("limit", 20)), MAX_PAGE_SIZE))
+    cursor = args.get("cursor", "").strip()
+
+    match = {"seller_id": seller_obj_id}
+    if cursor:
+        match = {"$and": [match, keyset_match(cursor)]}
+
+    # Newest first, one page at a time; the buyer join only fetches usernames
+    pipeline = [
+        {"$match": match},
+        {"$sort": keyset_sort()},
+        {"$limit": limit + 1},
+        {"$lookup": {
+            "from": "users",
+            "let": {"buyer_id": "$buyer_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$buyer_id"]}}},
+                {"$project": {"_id": 0, "username": 1}}
+            ],
+            "as": "buyer"
+        }},
+        {"$unwind": "$buyer"},
+        {"$project": {
+            "_id": 1,
+            "rating": 1,
+            "comment": 1,
+            "created_at": 1,
+            "buyerName": "$buyer.username"
+        }}
+    ]
+    return pipeline, limit
+
+def seller_ratings_response(ratings, limit, seller):
+    has_more = len(ratings) > limit
+    ratings = ratings[:limit]
+    return {
+        "ratings": ratings,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(ratings[-1]) if has_more and ratings else None,
+        **rating_summary(seller)
+    }
+
 @app.route("/api/seller-ratings/<seller_id>", methods=["GET"])
 def get_seller_ratings(seller_id):
     try:
-        pipeline = [
-            {"$match": {"seller_id": ObjectId(seller_id)}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "buyer_id",
-                "foreignField": "_id",
-                "as": "buyer"
-            }},
-            {"$unwind": "$buyer"},
-            {"$project": {
-                "_id": 1,
-                "rating": 1,
-                "comment": 1,
-                "created_at": 1,
-                "buyerName": "$buyer.username"
-            }}
-        ]
-        ratings = list(ratings_collection.aggregate(pipeline))
-        seller = users_collection.find_one({"_id": ObjectId(seller_id)}, {"avg_rating": 1, "total_ratings": 1})
-        return jsonify({
-            "ratings": serialize_objectid(ratings),
-            "avg_rating": seller.get("avg_rating", 0),
-            "total_ratings": seller.get("total_ratings", 0)
-        })
+        seller_obj_id = ObjectId(seller_id)
+        pipeline, limit = seller_ratings_plan(seller_obj_id, request.args)
+        ratings = list(browse_ratings.aggregate(pipeline))
+        seller = browse_users.find_one({"_id": seller_obj_id}, RATING_SUMMARY_FIELDS)
+        return jsonify(seller_ratings_response(ratings, limit, seller))
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error fetching seller ratings: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/seller-ratings/<seller_id>/summary", methods=["GET"])
+def get_seller_rating_summary(seller_id):
+    try:
+        seller = browse_users.find_one({"_id": ObjectId(seller_id), "role": "seller"}, RATING_SUMMARY_FIELDS)
+        if not seller:
+            return jsonify({"error": "Seller not found"}), 404
+        return jsonify(rating_summary(seller))
     except Exception as e:
-        print(f"Error fetching seller ratings: {str(e)}")
+        logger.error("Error fetching seller rating summary: %s", e)
         return jsonify({"error": str(e)}), 500
 
+# One round trip: the listing and a projected seller snapshot
+VEHICLE_DETAIL_STAGES = [
+    {"$limit": 1},
+    {"$lookup": {
+        "from": "users",
+        "let": {"seller_id": "$seller_id"},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$seller_id"]}}},
+            {"$project": {"_id": 0, "businessName": 1, "businessPhone": 1, "phone": 1}}
+        ],
+        "as": "seller"
+    }},
+    {"$set": {"seller": {"$arrayElemAt": ["$seller", 0]}}},
+    {"$set": {
+        "sellerBusinessName": {"$ifNull": ["$seller.businessName", ""]},
+        "sellerContact": {"$ifNull": ["$seller.businessPhone", "$seller.phone", ""]}
+    }},
+    {"$unset": "seller"}
+]
+
 @app.route("/api/vehicles/<vehicle_id>", methods=["GET"])
 def get_vehicle_details(vehicle_id):
     try:
-        vehicle = cars_collection.find_one({"_id": ObjectId(vehicle_id)})
-        if not vehicle:
-            return jsonify({"error": "Vehicle not found"}), 404
-
-        seller = users_collection.find_one({"_id": vehicle["seller_id"]})
-        vehicle["sellerBusinessName"] = seller.get("businessName", "")
-        vehicle["sellerContact"] = seller.get("businessPhone", seller.get("phone", ""))
-        return jsonify(serialize_objectid(vehicle))
+        vehicle = vehicle_cache.get(vehicle_id)
+        if vehicle is None:
+            pipeline = [{"$match": {"_id": ObjectId(vehicle_id)}}, *VEHICLE_DETAIL_STAGES]
+            vehicle = next(cars_collection.aggregate(pipeline), None)
+            if not vehicle:
+                return jsonify({"error": "Vehicle not found"}), 404
+            vehicle_cache.put(vehicle_id, vehicle)
+        return jsonify(vehicle)
     except Exception as e:
-        print(f"Error fetching vehicle details: {str(e)}")
+        logger.error("Error fetching vehicle details: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def view_session_key():
+    """Who is viewing, for unique-view dedup: the user, else the client."""
+    if "user_id" in session:
+        return f"u:{session['user_id']}"
+    client_id = request.headers.get("X-Session-Id")
+    if client_id:
+        return f"s:{client_id}"
+    return f"a:{request.remote_addr}:{request.headers.get('User-Agent', '')}"
+
 @app.route("/api/vehicles/<vehicle_id>/view", methods=["POST"])
 def increment_vehicle_view(vehicle_id):
     try:
-        cars_collection.update_one(
-            {"_id": ObjectId(vehicle_id)},
-            {"$inc": {"views": 1}}
-        )
+        view_counter.record(ObjectId(vehicle_id), view_session_key())
         return jsonify({"message": "View count incremented"})
     except Exception as e:
-        print(f"Error incrementing vehicle view: {str(e)}")
+        logger.error("Error incrementing vehicle view: %s", e)
         return jsonify({"error": str(e)}), 500
 
 # ----------------- Run -----------------
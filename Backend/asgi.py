@@ -0,0 +1,174 @@
+"""ASGI entry point: async MongoDB for the browse/ratings reads, Flask for the rest.
+
+The read endpoints that spend their time waiting on Mongo aggregates are
+served by Quart handlers on an async driver, so one process can hold
+thousands of concurrent browsers. Every other route, including model
+inference, goes to the Flask app on a thread pool (ASGI_WSGI_THREADS).
+Both share the Flask app's query builders, caches, JSON encoding and
+session cookie. Run with:
+
+    uvicorn asgi:app --port 5002        (or hypercorn asgi:app)
+"""
+import inspect
+import os
+
+from a2wsgi import WSGIMiddleware
+from bson.objectid import ObjectId
+from quart import Quart, Response, request, session
+from werkzeug.exceptions import HTTPException
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:
+    from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+import app as sync_app
+from log_config import get_logger
+from mongo_pool import browse_collection, pool_options
+from pagination import InvalidCursor
+
+flask_app = sync_app.app
+logger = get_logger("asgi")
+
+# Same pool settings, metrics and read routing as the sync client; pending
+# listings are an admin view and vehicle details fill a cache, so both read
+# from the primary
+async_client = AsyncMongoClient(sync_app.mongo_uri, event_listeners=[sync_app.pool_metrics], **pool_options())
+async_db = async_client.vehicle_marketplace
+cars = browse_collection(async_db, "cars")
+users = browse_collection(async_db, "users")
+ratings = browse_collection(async_db, "ratings")
+primary_cars = async_db.cars
+
+quart_app = Quart(__name__)
+quart_app.secret_key = flask_app.secret_key
+
+
+def json_response(obj, status=200):
+    return Response(flask_app.json.dumps(obj), status=status, mimetype="application/json")
+
+
+async def aggregate(collection, pipeline):
+    # AsyncMongoClient's aggregate is a coroutine returning the cursor; Motor's returns it directly
+    cursor = collection.aggregate(pipeline)
+    if inspect.isawaitable(cursor):
+        cursor = await cursor
+    return await cursor.to_list(None)
+
+
+@quart_app.after_request
+async def add_cors_headers(response):
+    origin = request.headers.get("Origin")
+    if origin in sync_app.CORS_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Vary"] = "Origin"
+    return response
+
+
+@quart_app.route("/api/cars", methods=["GET"])
+async def get_cars():
+    try:
+        plan = sync_app.cars_page_plan(request.args, sync_app.viewer_is_admin(session))
+        page = await aggregate(cars, plan["pipeline"])
+        total = await sync_app.count_cache.count_async(cars, plan["query"]) if plan["include_total"] else None
+        return json_response(sync_app.cars_page_response(page, plan, total))
+    except (sync_app.InvalidQuery, InvalidCursor) as e:
+        return json_response({"error": str(e)}, 400)
+    except Exception as e:
+        logger.error("Error fetching cars: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@quart_app.route("/api/cars/search", methods=["GET"])
+async def search_cars():
+    try:
+        pipeline, page, limit = sync_app.search_plan(request.args, sync_app.viewer_is_admin(session))
+        raw = await aggregate(cars, pipeline)
+        return json_response(sync_app.search_response(raw[0] if raw else {}, page, limit))
+    except sync_app.InvalidQuery as e:
+        return json_response({"error": str(e)}, 400)
+    except Exception as e:
+        logger.error("Error searching cars: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@quart_app.route("/api/admin/pending-listings", methods=["GET"])
+async def get_pending_listings():
+    if "user_id" not in session:
+        return json_response({"error": "Authentication required", "authenticated": False}, 401)
+    if session.get("role") != "admin":
+        return json_response({"error": "Unauthorized"}, 403)
+    try:
+        return json_response(await aggregate(primary_cars, sync_app.PENDING_LISTINGS_PIPELINE))
+    except Exception as e:
+        logger.error("Error fetching pending listings: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@quart_app.route("/api/seller-ratings/<seller_id>", methods=["GET"])
+async def get_seller_ratings(seller_id):
+    try:
+        seller_obj_id = ObjectId(seller_id)
+        pipeline, limit = sync_app.seller_ratings_plan(seller_obj_id, request.args)
+        page = await aggregate(ratings, pipeline)
+        seller = await users.find_one({"_id": seller_obj_id}, sync_app.RATING_SUMMARY_FIELDS)
+        return json_response(sync_app.seller_ratings_response(page, limit, seller))
+    except InvalidCursor as e:
+        return json_response({"error": str(e)}, 400)
+    except Exception as e:
+        logger.error("Error fetching seller ratings: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@quart_app.route("/api/seller-ratings/<seller_id>/summary", methods=["GET"])
+async def get_seller_rating_summary(seller_id):
+    try:
+        seller = await users.find_one({"_id": ObjectId(seller_id), "role": "seller"}, sync_app.RATING_SUMMARY_FIELDS)
+        if not seller:
+            return json_response({"error": "Seller not found"}, 404)
+        return json_response(sync_app.rating_summary(seller))
+    except Exception as e:
+        logger.error("Error fetching seller rating summary: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+@quart_app.route("/api/vehicles/<vehicle_id>", methods=["GET"])
+async def get_vehicle_details(vehicle_id):
+    try:
+        vehicle = sync_app.vehicle_cache.get(vehicle_id)
+        if vehicle is None:
+            # From the primary, like the Flask handler, so invalidations stick
+            found = await aggregate(primary_cars, [{"$match": {"_id": ObjectId(vehicle_id)}},
+                                                   *sync_app.VEHICLE_DETAIL_STAGES])
+            if not found:
+                return json_response({"error": "Vehicle not found"}, 404)
+            vehicle = found[0]
+            sync_app.vehicle_cache.put(vehicle_id, vehicle)
+        return json_response(vehicle)
+    except Exception as e:
+        logger.error("Error fetching vehicle details: %s", e)
+        return json_response({"error": str(e)}, 500)
+
+
+wsgi_app = WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_WSGI_THREADS", 16)))
+async_routes = quart_app.url_map.bind("localhost")
+
+
+def is_async_route(scope):
+    # Only plain reads: CORS preflights are answered by Flask, and exports
+    # stream from Flask too
+    if scope["method"] not in ("GET", "HEAD") or b"format=" in scope.get("query_string", b""):
+        return False
+    try:
+        async_routes.match(scope["path"], method=scope["method"])
+        return True
+    except HTTPException:
+        return False
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan" or (scope["type"] == "http" and is_async_route(scope)):
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
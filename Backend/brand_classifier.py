@@ -0,0 +1,97 @@
+import warnings
+
+import numpy as np
+
+# Column order the brand/model classifier is trained on, when the model
+# does not record its own feature names
+BRAND_FEATURES = ["Condition", "Gear", "Fuel Type", "YOM", "Engine (cc)", "Price", "Millage(KM)", "Town", "Leasing"]
+NUMERIC_FEATURES = {"YOM", "Engine (cc)", "Price", "Millage(KM)"}
+TARGETS = ["Brand", "Model"]
+TOP_K = 3
+
+# Rows are passed as plain arrays on purpose; models fitted on a DataFrame
+# would otherwise warn on every call
+warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+
+
+def top_k(probs, k=TOP_K):
+    """Indices of the ``k`` largest probabilities, highest first."""
+    if len(probs) > k:
+        # Sorted first so ties go to the lowest index, as argmax does
+        idx = np.sort(np.argpartition(probs, -k)[-k:])
+    else:
+        idx = np.arange(len(probs))
+    return idx[np.argsort(-probs[idx], kind="stable")]
+
+
+class BrandClassifier:
+    """Brand/model classifier with its encoders flattened into lookup tables.
+
+    Inputs become a float row through dict lookups, and one
+    ``predict_proba`` per batch yields both the labels (its argmax, which
+    is what ``predict`` computes) and the top-k lists.
+    """
+
+    def __init__(self, model, encoders):
+        self.model = model
+        self.encoders = encoders
+        self.features = [str(name) for name in getattr(model, "feature_names_in_", BRAND_FEATURES)]
+        self.codes = {
+            col: {str(cls): code for code, cls in enumerate(encoders[col].classes_)}
+            for col in self.features
+            if col not in NUMERIC_FEATURES and col in encoders
+        }
+        # Label name for each predict_proba column, per target
+        self.labels = [
+            np.asarray(encoders[target].classes_)[np.asarray(classes).astype(int)].tolist()
+            for target, classes in zip(TARGETS, model.classes_)
+        ]
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        return cls(bundle["model"], bundle["encoders"])
+
+    def encode(self, values):
+        """``(row, None)`` for a dict of feature values, or ``(None, error)``."""
+        row = np.empty(len(self.features), dtype=np.float64)
+        for i, col in enumerate(self.features):
+            value = values.get(col)
+            codes = self.codes.get(col)
+            if codes is None:
+                try:
+                    row[i] = float(value)
+                except (TypeError, ValueError):
+                    return None, {"error": f"Input value for '{col}' must be a number", "field": col,
+                                  "value": str(value)}
+                continue
+            code = codes.get(str(value))
+            if code is None:
+                return None, {
+                    "error": f"Input value for '{col}' is invalid: unknown label {value!r}",
+                    "field": col,
+                    "value": str(value),
+                    "available_values": list(codes)
+                }
+            row[i] = code
+        return row, None
+
+    def predict_rows(self, X):
+        """Per row, one probability array per target."""
+        probs = self.model.predict_proba(X)
+        return [[target_probs[i] for target_probs in probs] for i in range(X.shape[0])]
+
+    def describe(self, row_probs):
+        brand_probs, model_probs = row_probs
+        brand_idx = top_k(brand_probs)
+        model_idx = top_k(model_probs)
+        brand_labels, model_labels = self.labels
+        # The label is exactly what model.predict would return
+        brand, model = np.argmax(brand_probs), np.argmax(model_probs)
+        return {
+            "brand": brand_labels[brand],
+            "brand_confidence": float(brand_probs[brand]),
+            "brand_top_k": [{"brand": brand_labels[i], "prob": float(brand_probs[i])} for i in brand_idx],
+            "model": model_labels[model],
+            "model_confidence": float(model_probs[model]),
+            "model_top_k": [{"model": model_labels[i], "prob": float(model_probs[i])} for i in model_idx]
+        }
@@ -0,0 +1,104 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# Columns that make up the make -> model -> year -> {fuel, transmission, engine} tree
+CATALOG_COLUMNS = ['make', 'model', 'year', 'fuel_type', 'transmission_type', 'engine']
+
+
+class JsonPayload:
+    """A JSON body serialized once, together with its strong ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, value):
+        self.body = json.dumps(value, separators=(",", ":"))
+        self.etag = hashlib.sha1(self.body.encode("utf-8")).hexdigest()
+
+
+EMPTY_LIST = JsonPayload([])
+
+
+def _mileage_ranges(car_data, step=10000):
+    max_mileage = car_data[car_data['condition'] == 'used']['mileage'].max()
+    bins = np.arange(0, max_mileage + step + 1, step)
+    ranges = [f"{int(bins[i])}-{int(bins[i+1] - 1)}" for i in range(len(bins) - 1)]
+    ranges[-1] = f"{int(bins[-2])}+"
+    return ranges
+
+
+class CatalogIndex:
+    """Dropdown values for the predict form, precomputed from the dataset.
+
+    Every lookup is a dict access returning a ``JsonPayload``; unknown keys
+    return an empty list, matching what a filter over the DataFrame returned.
+    """
+
+    def __init__(self, car_data):
+        tree = {}
+        combos = car_data[CATALOG_COLUMNS].dropna(subset=['make', 'model', 'year']).drop_duplicates()
+        for make, model, year, fuel, transmission, engine in combos.itertuples(index=False, name=None):
+            node = tree.setdefault(make, {}).setdefault(model, {}).setdefault(int(year), (set(), set(), set()))
+            if pd.notna(fuel):
+                node[0].add(fuel)
+            if pd.notna(transmission):
+                node[1].add(transmission)
+            if pd.notna(engine):
+                node[2].add(float(engine))
+
+        self.models = {}
+        self.years = {}
+        self.fuel_types = {}
+        self.transmissions = {}
+        self.engine_sizes = {}
+
+        # Arrays rather than objects so the frontend keeps our ordering
+        # (JS reorders integer-like object keys such as years).
+        catalog_makes = []
+        for make in sorted(tree):
+            catalog_models = []
+            for model in sorted(tree[make]):
+                years = sorted(tree[make][model], reverse=True)
+                catalog_years = []
+                for year in years:
+                    fuels, transmissions, engines = (sorted(s) for s in tree[make][model][year])
+                    key = (make, model, year)
+                    self.fuel_types[key] = JsonPayload(fuels)
+                    self.transmissions[key] = JsonPayload(transmissions)
+                    self.engine_sizes[key] = JsonPayload(engines)
+                    catalog_years.append({
+                        "year": year,
+                        "fuel_types": fuels,
+                        "transmissions": transmissions,
+                        "engine_sizes": engines
+                    })
+                self.years[(make, model)] = JsonPayload(years)
+                catalog_models.append({"name": model, "years": catalog_years})
+            self.models[make] = JsonPayload(sorted(tree[make]))
+            catalog_makes.append({"name": make, "models": catalog_models})
+
+        makes = sorted(tree)
+        towns = sorted(car_data['town'].dropna().unique().tolist())
+        mileage_ranges = _mileage_ranges(car_data)
+
+        self.makes = JsonPayload(makes)
+        self.towns = JsonPayload(towns)
+        self.mileage_ranges = JsonPayload(mileage_ranges)
+        self.catalog = JsonPayload({
+            "makes": catalog_makes,
+            "towns": towns,
+            "mileage_ranges": mileage_ranges
+        })
+
+    def lookup(self, table, *key):
+        if len(key) == 1:
+            key = key[0]
+        return table.get(key, EMPTY_LIST)
+
+
+def build_catalog_index(car_data):
+    if car_data is None or car_data.empty:
+        return None
+    return CatalogIndex(car_data)
@@ -0,0 +1,160 @@
+"""Declared MongoDB indexes for the marketplace, and tools to apply and check them.
+
+Run from the Backend directory:
+
+    python db_indexes.py ensure    # create missing indexes (idempotent)
+    python db_indexes.py report    # missing / undeclared / unused indexes
+    python db_indexes.py explain   # winning plan for each hot query
+"""
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import OperationFailure
+
+from search import TEXT_INDEX_NAME, TEXT_INDEX_WEIGHTS
+
+# collection -> list of (name, keys, options)
+INDEXES = {
+    "users": [
+        ("email_unique", [("email", ASCENDING)], {"unique": True}),
+        # Sellers can be created without a username, so only non-empty names must be unique
+        ("username_unique", [("username", ASCENDING)], {
+            "unique": True,
+            "partialFilterExpression": {"username": {"$type": "string", "$gt": ""}}
+        }),
+        ("role_created", [("role", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "cars": [
+        ("status_created", [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ("seller_created", [("seller_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ("status_price", [("status", ASCENDING), ("price", ASCENDING)], {}),
+        (TEXT_INDEX_NAME, [(field, "text") for field in TEXT_INDEX_WEIGHTS], {
+            "weights": TEXT_INDEX_WEIGHTS,
+            "default_language": "english"
+        }),
+    ],
+    "ratings": [
+        ("seller_created", [("seller_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ("buyer", [("buyer_id", ASCENDING)], {}),
+    ],
+}
+
+# Filters and sorts the hot endpoints issue; `explain` checks each is served by an index
+HOT_QUERIES = [
+    ("login / signup", "users", {"email": "admin@marketplace.com"}, None),
+    ("signup duplicate check", "users", {"$or": [{"email": "x@y.z"}, {"username": "x"}]}, None),
+    ("admin users by role", "users", {"role": "seller"}, None),
+    ("browse cars", "cars", {"status": "approved"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("browse cars by price", "cars", {"status": "approved", "price": {"$gte": 0, "$lte": 10000000}}, None),
+    ("pending listings", "cars", {"status": "pending"}, None),
+    ("my listings", "cars", {"seller_id": None}, None),
+    ("search cars", "cars", {"$text": {"$search": "toyota"}, "status": "approved"}, None),
+    ("seller ratings", "ratings", {"seller_id": None}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+]
+
+
+def ensure_indexes(db, logger=None):
+    """Create every declared index that does not exist yet.
+
+    Returns ``{collection: [index names created or confirmed]}``. Conflicts
+    (e.g. duplicate emails blocking a unique index) are logged and skipped.
+    """
+    applied = {}
+    for coll_name, specs in INDEXES.items():
+        collection = db[coll_name]
+        applied[coll_name] = []
+        for name, keys, options in specs:
+            try:
+                collection.create_index(keys, name=name, **options)
+                applied[coll_name].append(name)
+            except OperationFailure as e:
+                if logger:
+                    logger.error("Could not create index %s.%s: %s", coll_name, name, e)
+    return applied
+
+
+def index_report(db):
+    """Missing, undeclared and unused indexes per collection."""
+    report = {}
+    for coll_name, specs in INDEXES.items():
+        collection = db[coll_name]
+        declared = {name for name, _, _ in specs}
+        existing = set(collection.index_information())
+        usage = {}
+        try:
+            for stat in collection.aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat["accesses"]["ops"]
+        except OperationFailure:
+            pass
+        report[coll_name] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared - {"_id_"}),
+            "unused": sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_"),
+            "usage": usage
+        }
+    return report
+
+
+def _plan_stages(plan):
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        if "inputStages" in plan:
+            for child in plan["inputStages"]:
+                stages.extend(_plan_stages(child))
+            break
+        plan = plan.get("inputStage")
+    return stages
+
+
+def explain_hot_queries(db):
+    """Winning plan stages for each hot query; ``collscan`` flags a missing index."""
+    results = []
+    for label, coll_name, query, sort in HOT_QUERIES:
+        query = {k: (v if v is not None else _any_object_id(db, coll_name, k)) for k, v in query.items()}
+        cursor = db[coll_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = cursor.limit(10).explain()
+            winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+            stages = _plan_stages(winning.get("queryPlan", winning))
+            results.append({
+                "query": label,
+                "collection": coll_name,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages
+            })
+        except OperationFailure as e:
+            results.append({"query": label, "collection": coll_name, "error": str(e)})
+    return results
+
+
+def _any_object_id(db, coll_name, field):
+    doc = db[coll_name].find_one({field: {"$exists": True}}, {field: 1})
+    return doc[field] if doc else None
+
+
+def main(argv):
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    db = client.vehicle_marketplace
+    command = argv[1] if len(argv) > 1 else "ensure"
+    if command == "ensure":
+        result = ensure_indexes(db)
+    elif command == "report":
+        result = index_report(db)
+    elif command == "explain":
+        result = explain_hot_queries(db)
+    else:
+        print(__doc__)
+        return 2
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,63 @@
+import csv
+import io
+
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_BATCH_SIZE = 500
+# Rows written to the CSV buffer before it is flushed to the client
+CSV_CHUNK_ROWS = 200
+# Leading characters that make spreadsheets evaluate a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _ndjson(rows, dumps):
+    for row in rows:
+        yield dumps(row) + "\n"
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return str(value)
+    text = ";".join(str(v) for v in value) if isinstance(value, (list, tuple)) else str(value)
+    # User-entered text is quoted so it opens as text, not a formula (OWASP CSV injection)
+    if text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def _csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    pending = 1
+    for row in rows:
+        writer.writerow([_csv_value(row.get(field)) for field in fields])
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def export_response(rows, fmt, fields, filename, dumps):
+    """Stream ``rows`` (any iterable, typically a Mongo cursor) as NDJSON or CSV.
+
+    Nothing is materialized: each document is encoded as the cursor yields
+    it, so memory stays flat and the first bytes go out immediately.
+    """
+    if fmt == "csv":
+        body = _csv(rows, fields)
+    else:
+        body = _ndjson(rows, dumps)
+    response = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
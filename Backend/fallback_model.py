@@ -0,0 +1,137 @@
+"""Fallback brand/model classifier, trained when the full one is missing.
+
+Training never runs on the import path: the app starts it on a background
+thread in whichever process takes the lock file first, and everyone else
+picks the artifact up through the model registry once it exists. It can
+also be trained offline:
+
+    python fallback_model.py train
+"""
+import os
+import sys
+import threading
+import time
+
+import joblib
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+# Same columns, in the same order, as /api/predict_brand_model builds
+FEATURES = ["Condition", "Gear", "Fuel Type", "YOM", "Engine (cc)", "Price", "Millage(KM)", "Town", "Leasing"]
+CATEGORICAL = ["Condition", "Gear", "Fuel Type", "Town", "Leasing"]
+TARGETS = ["Brand", "Model"]
+
+
+def _dump(value, path):
+    # Uncompressed so it loads quickly; renamed into place so
+    # no reader ever sees a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(value, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+
+
+def train_fallback_model(csv_path, model_path, encoders_path, n_estimators=50, max_depth=10, n_jobs=1):
+    """Train the smaller classifier; ``n_jobs`` is for fitting only, the saved model predicts on one core."""
+    df = pd.read_csv(csv_path)[FEATURES + TARGETS].dropna()
+
+    encoders = {}
+    for col in CATEGORICAL + TARGETS:
+        le = LabelEncoder()
+        df[col] = le.fit_transform(df[col].astype(str))
+        encoders[col] = le
+    # The dataset is in lakhs; the endpoint sends rupees
+    df["Price"] = df["Price"] * 100000
+
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=n_jobs)
+    model.fit(df[FEATURES], df[TARGETS])
+    model.n_jobs = 1
+
+    # Encoders first: the registry only loads the pair once the model exists
+    _dump(encoders, encoders_path)
+    _dump(model, model_path)
+
+
+class FallbackTrainer:
+    """Runs ``train_fallback_model`` on a daemon thread, at most once across processes.
+
+    A ``<model_path>.lock`` file marks training in progress; a lock older
+    than ``lock_timeout`` seconds is assumed to belong to a dead process.
+    """
+
+    def __init__(self, csv_path, model_path, encoders_path, lock_timeout=1800, logger=None):
+        self.csv_path = csv_path
+        self.model_path = model_path
+        self.encoders_path = encoders_path
+        self.lock_path = f"{model_path}.lock"
+        self.lock_timeout = lock_timeout
+        self.logger = logger
+        self.error = None
+        self._thread = None
+
+    def _acquire(self):
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) < self.lock_timeout:
+                        return False
+                    os.remove(self.lock_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            # One core, so training in a serving process does not starve its requests
+            train_fallback_model(self.csv_path, self.model_path, self.encoders_path, n_jobs=1)
+            if self.logger:
+                self.logger.info("Fallback classifier trained",
+                                 extra={"seconds": round(time.perf_counter() - started, 1)})
+        except Exception as e:
+            self.error = str(e)
+            if self.logger:
+                self.logger.error("Error training fallback classifier: %s", e)
+        finally:
+            os.remove(self.lock_path)
+
+    def start(self):
+        """Start training unless the artifact exists or another process is on it."""
+        os.makedirs(os.path.dirname(self.model_path) or ".", exist_ok=True)
+        if os.path.exists(self.model_path) or not self._acquire():
+            return False
+        self._thread = threading.Thread(target=self._run, name="fallback-trainer", daemon=True)
+        self._thread.start()
+        return True
+
+    def status(self):
+        """State as seen from any process: ready, training, failed or idle."""
+        if os.path.exists(self.model_path) and os.path.exists(self.encoders_path):
+            return "ready"
+        if os.path.exists(self.lock_path):
+            return "training"
+        return "failed" if self.error else "idle"
+
+
+def main(argv):
+    if len(argv) > 1 and argv[1] == "train":
+        train_fallback_model(
+            "csv/car_price_dataset.csv",
+            "models/smaller_multi_target_classifier.joblib",
+            "models/smaller_classifier_label_encoders.joblib",
+            n_jobs=-1
+        )
+        print("trained models/smaller_multi_target_classifier.joblib")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,152 @@
+"""Versioned feature schema for the price model.
+
+The schema records what the model was trained on: the feature column
+order, each categorical column's classes in code order (code = index, as
+``LabelEncoder`` assigns them) and the numeric columns' dtypes, plus the
+SHA-256 of the model file it belongs to. It is plain JSON, so the API
+loads it in milliseconds and encodes with dict lookups instead of
+refitting encoders from the CSV. Write it after training with:
+
+    python feature_schema.py build
+"""
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 1
+
+PRICE_FEATURE_ORDER = ['make', 'model', 'engine', 'transmission_type', 'fuel_type',
+                       'mileage', 'town', 'leasing', 'condition', 'car_age']
+PRICE_CATEGORICAL_FIELDS = ['make', 'model', 'fuel_type', 'transmission_type', 'condition', 'town', 'leasing']
+
+DATASET_COLUMNS = {
+    'Brand': 'make',
+    'Model': 'model',
+    'YOM': 'year',
+    'Fuel Type': 'fuel_type',
+    'Gear': 'transmission_type',
+    'Condition': 'condition',
+    'Millage(KM)': 'mileage',
+    'Engine (cc)': 'engine',
+    'Town': 'town',
+    'Leasing': 'leasing'
+}
+
+
+class SchemaMismatch(Exception):
+    pass
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_price_dataset(csv_path):
+    """The training CSV with the API's column names and lower-cased categories."""
+    df = pd.read_csv(csv_path)
+    df['Car_Age'] = datetime.now().year - df['YOM']
+    df.rename(columns=DATASET_COLUMNS, inplace=True)
+    for col in ['make', 'model', 'condition', 'fuel_type', 'transmission_type', 'town', 'leasing']:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.lower().str.strip()
+    return df
+
+
+class FeatureSchema:
+    def __init__(self, feature_order, categories, numeric, model_sha256=None, created_at=None,
+                 version=SCHEMA_VERSION):
+        self.version = version
+        self.feature_order = list(feature_order)
+        self.categories = {col: list(classes) for col, classes in categories.items()}
+        self.numeric = dict(numeric)
+        self.model_sha256 = model_sha256
+        self.created_at = created_at
+        missing = [col for col in self.feature_order if col not in self.categories and col not in self.numeric]
+        if missing:
+            raise SchemaMismatch(f"no dtype for numeric features {missing}")
+        self._numeric_types = {col: np.dtype(dtype).type for col, dtype in self.numeric.items()}
+
+    def cast(self, col, value):
+        """``value`` as the dtype numeric column ``col`` was trained with (a plain Python number)."""
+        return self._numeric_types[col](value).item()
+
+    def numeric_column(self, col, values):
+        """Array of ``values`` in the dtype numeric column ``col`` was trained with."""
+        return np.asarray(values, dtype=self.numeric[col])
+
+    @classmethod
+    def from_dataset(cls, df, feature_order=PRICE_FEATURE_ORDER, categorical=PRICE_CATEGORICAL_FIELDS,
+                     model_path=None):
+        """Schema equivalent to fitting a ``LabelEncoder`` per categorical column of ``df``."""
+        categories = {col: sorted(df[col].dropna().unique().tolist()) for col in categorical if col in df.columns}
+        numeric = {
+            col: str(df[col].dtype) if col in df.columns else "float64"
+            for col in feature_order if col not in categorical
+        }
+        return cls(
+            feature_order, categories, numeric,
+            model_sha256=file_sha256(model_path) if model_path else None,
+            created_at=datetime.now(timezone.utc).isoformat()
+        )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("schema_version") != SCHEMA_VERSION:
+            raise SchemaMismatch(f"{path} has schema version {data.get('schema_version')}, expected {SCHEMA_VERSION}")
+        # Schemas written without dtypes were built from float64 matrices
+        numeric = data.get("numeric") or {
+            col: "float64" for col in data["feature_order"] if col not in data["categories"]
+        }
+        return cls(data["feature_order"], data["categories"], numeric,
+                   data.get("model_sha256"), data.get("created_at"), data["schema_version"])
+
+    def to_dict(self):
+        return {
+            "schema_version": self.version,
+            "created_at": self.created_at,
+            "model_sha256": self.model_sha256,
+            "feature_order": self.feature_order,
+            "categories": self.categories,
+            "numeric": self.numeric
+        }
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def verify(self, model_path):
+        """Raise ``SchemaMismatch`` unless ``model_path`` is the model this schema was written for."""
+        if self.model_sha256 is None or not os.path.exists(model_path):
+            return
+        actual = file_sha256(model_path)
+        if actual != self.model_sha256:
+            raise SchemaMismatch(f"{model_path} has sha256 {actual[:12]}, schema expects {self.model_sha256[:12]}")
+
+
+def main(argv):
+    if len(argv) > 1 and argv[1] == "build":
+        model_path = "models/car_price_model_retrained.joblib"
+        schema_path = "models/car_price_feature_schema.json"
+        schema = FeatureSchema.from_dataset(load_price_dataset("csv/car_price_dataset.csv"), model_path=model_path)
+        schema.save(schema_path)
+        print(f"wrote {schema_path} for {model_path} ({schema.model_sha256[:12]})")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
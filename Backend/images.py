@@ -0,0 +1,236 @@
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+DERIVED_DIR = "derived"
+# Leading bytes of each accepted image type
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+]
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+
+def sniff_image_type(header):
+    """Canonical extension for ``header`` bytes, or None if it is not an accepted image."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    return None
+
+
+class UploadSpool:
+    """File-like sink Werkzeug streams one multipart file part into.
+
+    Chunks go straight to a temp file while being hashed and size-checked,
+    and the type is sniffed from the first bytes: a part that is not a
+    JPEG/PNG is dropped as it arrives (``rejected``), and one larger than
+    ``max_size`` aborts the request with 413. ``finalize`` later moves the
+    temp file to its content-addressed name; closing an unclaimed spool
+    deletes the temp file.
+    """
+
+    def __init__(self, spool_dir, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.ext = None
+        self.rejected = False
+        self.claimed = False
+        self._digest = hashlib.sha256()
+        self._header = b""
+        fd, self.path = tempfile.mkstemp(dir=spool_dir, suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+
+    @property
+    def name(self):
+        """Content-addressed file name; valid once the part has been fully received."""
+        return f"{self._digest.hexdigest()[:32]}.{self.ext}"
+
+    def write(self, data):
+        if self.rejected:
+            return len(data)
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.discard()
+            raise RequestEntityTooLarge(f"Each image must be at most {self.max_size // (1024 * 1024)} MB")
+        if self.ext is None:
+            self._header += data[:SNIFF_BYTES]
+            if len(self._header) >= SNIFF_BYTES:
+                self.ext = sniff_image_type(self._header)
+                if self.ext is None:
+                    self.rejected = True
+                    self.discard()
+                    return len(data)
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def valid(self):
+        return not self.rejected and self.ext is not None and self.size > 0
+
+    def seek(self, offset, whence=0):
+        if self._file.closed:
+            return 0
+        self._file.flush()
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size) if not self._file.closed else b""
+
+    def tell(self):
+        return self._file.tell() if not self._file.closed else 0
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def claim(self):
+        """Keep the temp file past request teardown; the claimer must finalize or discard."""
+        self.claimed = True
+
+    def finalize(self, upload_dir):
+        """Move the received bytes to ``<upload_dir>/<name>``, deduplicating identical files."""
+        if not self._file.closed:
+            self._file.close()
+        final_path = os.path.join(upload_dir, self.name)
+        if os.path.exists(final_path):
+            os.remove(self.path)
+        else:
+            os.replace(self.path, final_path)
+        return self.name
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self.claimed:
+            if not self._file.closed:
+                self._file.close()
+        else:
+            self.discard()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return True
+
+
+def sweep_spool_dir(spool_dir, max_age=3600, logger=None):
+    """Delete ``*.part`` spool files older than ``max_age`` seconds; returns how many."""
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(spool_dir):
+        if entry.name.endswith(".part") and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    if removed and logger:
+        logger.info("Removed stale upload spool files", extra={"count": removed})
+    return removed
+
+
+def is_content_addressed(filename):
+    stem = filename.rsplit(".", 1)[0]
+    return len(stem) == 32 and all(c in "0123456789abcdef" for c in stem)
+
+
+class DerivativeWorker:
+    """Generates resized JPEG/PNG and WebP variants of uploads on a thread pool.
+
+    Variants are written to ``<upload_dir>/derived/<stem>_<width>.<fmt>``;
+    widths at or above the original's width are skipped. Without Pillow
+    the worker is disabled and originals are served as-is.
+    """
+
+    def __init__(self, upload_dir, widths=(320, 640, 1280), max_workers=2, quality=80, logger=None):
+        self.upload_dir = upload_dir
+        self.derived_dir = os.path.join(upload_dir, DERIVED_DIR)
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self.logger = logger
+        self.enabled = Image is not None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-derivatives")
+        os.makedirs(self.derived_dir, exist_ok=True)
+        if not self.enabled and logger:
+            logger.warning("Pillow not installed; image derivatives disabled")
+
+    def submit(self, name):
+        if self.enabled:
+            return self._executor.submit(self._generate, name)
+        return None
+
+    def _save(self, image, path, fmt, **options):
+        tmp_path = f"{path}.part"
+        image.save(tmp_path, fmt, **options)
+        os.replace(tmp_path, path)
+
+    def _generate(self, name):
+        stem, ext = name.rsplit(".", 1)
+        try:
+            with Image.open(os.path.join(self.upload_dir, name)) as source:
+                # Variants are saved without EXIF, so the Orientation tag
+                # browsers honour on the original is applied to the pixels
+                original = ImageOps.exif_transpose(source)
+                for width in self.widths:
+                    if width >= original.width:
+                        break
+                    height = max(1, round(original.height * width / original.width))
+                    resized = original.resize((width, height), Image.LANCZOS)
+                    base = os.path.join(self.derived_dir, f"{stem}_{width}")
+                    if ext == "png":
+                        self._save(resized, f"{base}.png", "PNG", optimize=True)
+                    else:
+                        self._save(resized.convert("RGB"), f"{base}.jpg", "JPEG",
+                                   quality=self.quality, optimize=True, progressive=True)
+                    self._save(resized, f"{base}.webp", "WEBP", quality=self.quality, method=4)
+        except Exception as e:
+            if self.logger:
+                self.logger.error("Error generating derivatives for %s: %s", name, e)
+
+    def best_variant(self, name, width, accept_webp):
+        """``(path, pending)``: the smallest variant at least ``width`` wide, relative to the upload dir.
+
+        Falls back to the original when no suitable variant exists; ``pending``
+        is True when that is because the variant may not have been generated
+        yet, so the answer can still change.
+        """
+        if not width or "." not in name:
+            return name, False
+        stem, ext = name.rsplit(".", 1)
+        formats = ("webp", ext) if accept_webp else (ext,)
+        for candidate in self.widths:
+            if candidate < width:
+                continue
+            for fmt in formats:
+                variant = f"{stem}_{candidate}.{fmt}"
+                if os.path.exists(os.path.join(self.derived_dir, variant)):
+                    return f"{DERIVED_DIR}/{variant}", False
+            # Variants are generated smallest first, so a missing one means
+            # the larger ones are missing too (or the original is smaller)
+            return name, self.enabled
+        return name, False
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
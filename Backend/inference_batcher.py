@@ -0,0 +1,95 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one model call.
+
+    Callers block in ``predict(row)`` while a dispatcher thread takes every
+    row queued so far (up to ``max_batch``), stacks them into one matrix,
+    calls ``predict_fn`` once and hands each caller its own result. Rows
+    that arrive while the model runs make up the next batch, so a lone
+    request is dispatched at once and batches only grow under load. A
+    ``max_wait`` above 0 also holds each batch open that many seconds
+    after its first row, trading latency for larger batches.
+    ``predict_fn(X)`` must return one result per row of ``X``. With
+    ``max_batch`` of 1 rows go straight to ``predict_fn`` on the caller's
+    thread.
+    """
+
+    def __init__(self, predict_fn, max_batch=64, max_wait=0.0, name="inference", logger=None):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.logger = logger
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.name = name
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started on first use, and again in each forked worker: threads do
+        # not survive fork, so one started in a preloading master would be gone
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def predict(self, row):
+        if self.max_batch <= 1:
+            return self.predict_fn(np.asarray(row, dtype=np.float64).reshape(1, -1))[0]
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Whatever is already queued is taken even once the window closes
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                results = self.predict_fn(np.asarray([row for row, _ in batch], dtype=np.float64))
+            except Exception as e:
+                if self.logger:
+                    self.logger.error("Error predicting %s batch of %d rows: %s", self.name, len(batch), e)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch
+        }
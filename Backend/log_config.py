@@ -0,0 +1,74 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra=`` fields merged in."""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """Route the ``drive_way`` loggers through a queue drained by a background thread.
+
+    Request threads only enqueue records; formatting and the blocking write
+    to stdout happen on the listener thread. ``LOG_LEVEL`` (default INFO) and
+    ``LOG_FORMAT`` (``json`` or ``text``, default json) configure it.
+    """
+    global _listener
+    if _listener is not None:
+        return logging.getLogger("drive_way")
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger("drive_way")
+    root.setLevel(level)
+    root.propagate = False
+    _start_listener(output)
+    atexit.register(lambda: _listener.stop())
+    # The listener thread does not survive fork (gunicorn --preload), so each
+    # child starts its own on a fresh queue
+    os.register_at_fork(after_in_child=lambda: _start_listener(output))
+    return root
+
+
+def _start_listener(output):
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    logging.getLogger("drive_way").handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+
+
+def get_logger(name):
+    return logging.getLogger(f"drive_way.{name}")
@@ -0,0 +1,167 @@
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger("drive_way.matching")
+
+# Alternative spellings users send for values the encoders know under another name
+SYNONYMS = {
+    'petrol': 'gasoline',
+    'gasoline': 'petrol',
+    'manual': 'manual',
+    'automatic': 'auto',
+    'auto': 'automatic',
+    'used': 'used',
+    'new': 'new',
+    'brand new': 'new',
+    'no': 'no leasing',
+    'yes': 'leasing',
+    'leasing': 'leasing',
+    'no leasing': 'no leasing',
+    'ongoing lease': 'ongoing lease',
+    'no lease': 'no leasing'
+}
+
+# Minimum trigram similarity for a fuzzy (typo-tolerant) match, as in pg_trgm
+FUZZY_THRESHOLD = 0.3
+
+MatchResult = namedtuple("MatchResult", ["value", "code", "score", "kind"])
+
+
+def normalize(value):
+    return str(value).lower().strip()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def padded_trigrams(text):
+    """Trigrams of ``text`` padded like pg_trgm, so word starts and ends count too."""
+    return ngrams(f"  {text} ", 3)
+
+
+class FieldMatcher:
+    """Resolves user input to one encoder class and its integer code.
+
+    Built once per encoder: exact hits are a dict lookup, synonyms a second
+    lookup, and partial/fuzzy hits only inspect classes sharing an n-gram
+    with the input instead of scanning every class.
+    """
+
+    def __init__(self, classes, field_name=""):
+        self.field_name = field_name
+        self.classes = list(classes.tolist() if hasattr(classes, 'tolist') else classes)
+        self.normalized = [normalize(cls) for cls in self.classes]
+
+        self.exact = {}
+        for code, norm in enumerate(self.normalized):
+            self.exact.setdefault(norm, code)
+
+        # postings[n][gram] -> codes of classes containing that n-gram (n = 1..3),
+        # so inputs shorter than three characters can still use the index.
+        self.postings = {1: {}, 2: {}, 3: {}}
+        self.short_codes = []
+        for code, norm in enumerate(self.normalized):
+            if len(norm) < 3:
+                self.short_codes.append(code)
+            for n, table in self.postings.items():
+                for gram in ngrams(norm, n):
+                    table.setdefault(gram, set()).add(code)
+
+        # Padded trigrams for fuzzy matching; a typo in a short word leaves
+        # few unpadded trigrams intact ("toyta" shares one with "toyota")
+        self.fuzzy_postings = {}
+        self.fuzzy_sizes = []
+        for code, norm in enumerate(self.normalized):
+            grams = padded_trigrams(norm)
+            self.fuzzy_sizes.append(len(grams))
+            for gram in grams:
+                self.fuzzy_postings.setdefault(gram, set()).add(code)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def _result(self, code, score, kind):
+        return MatchResult(self.classes[code], code, score, kind)
+
+    def _substring_codes(self, query):
+        n = min(3, len(query))
+        table = self.postings[n]
+        grams = ngrams(query, n)
+
+        # Classes containing the query contain every one of its n-grams
+        containing = None
+        for gram in grams:
+            codes = table.get(gram)
+            if not codes:
+                containing = set()
+                break
+            containing = set(codes) if containing is None else containing & codes
+        matches = {code for code in containing or () if query in self.normalized[code]}
+
+        # Classes contained in the query share at least one trigram with it
+        contained = set(self.short_codes)
+        for gram in ngrams(query, 3):
+            contained |= self.postings[3].get(gram, set())
+        matches.update(code for code in contained if self.normalized[code] in query)
+        return matches
+
+    def _fuzzy(self, query):
+        grams = padded_trigrams(query)
+        shared = {}
+        for gram in grams:
+            for code in self.fuzzy_postings.get(gram, ()):
+                shared[code] = shared.get(code, 0) + 1
+        best_code, best_score = None, 0.0
+        for code, count in shared.items():
+            score = count / (len(grams) + self.fuzzy_sizes[code] - count)
+            if score > best_score or (score == best_score and best_code is not None and code < best_code):
+                best_code, best_score = code, score
+        if best_code is None or best_score < FUZZY_THRESHOLD:
+            return None
+        return self._result(best_code, round(best_score, 3), "fuzzy")
+
+    def match(self, value):
+        """Return a ``MatchResult`` for ``value``, or None if nothing is close enough."""
+        result = self._match(value)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Field match", extra={
+                "field": self.field_name,
+                "input": str(value),
+                "matched": result.value if result else None,
+                "kind": result.kind if result else None,
+                "score": result.score if result else None
+            })
+        return result
+
+    def _match(self, value):
+        if not self.classes:
+            return None
+        query = normalize(value)
+        if not query:
+            return None
+
+        code = self.exact.get(query)
+        if code is not None:
+            return self._result(code, 1.0, "exact")
+
+        alternative = SYNONYMS.get(query)
+        if alternative is not None:
+            code = self.exact.get(alternative)
+            if code is not None:
+                return self._result(code, 1.0, "synonym")
+
+        substring_codes = self._substring_codes(query)
+        if substring_codes:
+            # Lowest code first, i.e. the first class in sorted encoder order
+            code = min(substring_codes)
+            norm = self.normalized[code]
+            score = min(len(norm), len(query)) / max(len(norm), len(query))
+            return self._result(code, round(score, 3), "partial")
+
+        return self._fuzzy(query)
+
+
+def build_matchers(categories):
+    """One matcher per column of ``{column: classes in code order}``."""
+    return {col: FieldMatcher(classes, col) for col, classes in categories.items()}
@@ -0,0 +1,193 @@
+"""Lazily loaded model artifacts.
+
+Compressed dumps spend most of their load time in zlib; rewriting them
+uncompressed once makes cold loads (and retries) much faster:
+
+    python model_registry.py uncompress models/*.joblib
+"""
+import os
+import sys
+import threading
+import time
+
+import joblib
+
+
+class _Entry:
+    def __init__(self, candidates, compiler, check):
+        self.candidates = candidates
+        self.compiler = compiler
+        self.check = check
+        self.backend = None
+        self.value = None
+        self.path = None
+        self.error = None
+        self.failed_at = None
+        self.load_seconds = None
+        self.files = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Named joblib artifacts, loaded once per process on first use.
+
+    Each name has one or more candidates, tried in order; a candidate is a
+    path, or a dict of part -> path loaded together (a model and the
+    encoders it was trained with), and is only used if all its files
+    exist. A failed load is retried after ``retry_interval`` seconds, so
+    an artifact written later is picked up without a restart. Loaded
+    names are re-stat'ed at most every ``check_interval`` seconds and
+    reloaded when any candidate's files change; ``version(name)`` tells
+    which files the served artifact came from.
+
+    ``mmap_mode`` is passed to ``joblib.load`` and only helps artifacts
+    that keep plain arrays: sklearn trees copy their node arrays out of
+    the map on unpickling, so a forest is a private copy either way. To
+    share one forest between workers, load it before forking (gunicorn
+    --preload with ``preload()``); the arrays' pages are then shared
+    copy-on-write, since serving never writes to them.
+
+    A name registered with a ``compiler`` serves ``compiler(artifact)``
+    instead (e.g. a flattened tree evaluator), falling back to the
+    artifact itself if compilation fails. A ``check(candidate)`` registered
+    with it runs before a candidate is loaded, and raising fails the load.
+    """
+
+    def __init__(self, mmap_mode=None, retry_interval=30.0, check_interval=5.0, logger=None):
+        self.mmap_mode = mmap_mode
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+        self.logger = logger
+        self._entries = {}
+
+    def register(self, name, *candidates, compiler=None, check=None):
+        self._entries[name] = _Entry(candidates, compiler, check)
+
+    def _paths(self, candidate):
+        return list(candidate.values()) if isinstance(candidate, dict) else [candidate]
+
+    def _stat_files(self, entry):
+        files = []
+        for candidate in entry.candidates:
+            for path in self._paths(candidate):
+                try:
+                    st = os.stat(path)
+                    files.append((path, st.st_mtime_ns, st.st_size))
+                except OSError:
+                    files.append((path, None, None))
+        return tuple(files)
+
+    def _changed(self, entry):
+        now = time.monotonic()
+        if now - entry.checked_at < self.check_interval:
+            return False
+        entry.checked_at = now
+        return self._stat_files(entry) != entry.files
+
+    def _load_path(self, path):
+        return joblib.load(path, mmap_mode=self.mmap_mode)
+
+    def _load(self, entry):
+        for candidate in entry.candidates:
+            if not all(os.path.exists(path) for path in self._paths(candidate)):
+                continue
+            if entry.check is not None:
+                entry.check(candidate)
+            if isinstance(candidate, dict):
+                value = {part: self._load_path(path) for part, path in candidate.items()}
+            else:
+                value = self._load_path(candidate)
+            return value, candidate
+        raise FileNotFoundError("none of " + ", ".join(
+            " + ".join(self._paths(candidate)) for candidate in entry.candidates) + " exist")
+
+    def available(self, name):
+        """Whether any candidate's files exist, without loading anything."""
+        return any(all(os.path.exists(path) for path in self._paths(candidate))
+                   for candidate in self._entries[name].candidates)
+
+    def get(self, name):
+        """The loaded artifact, or None if no candidate could be loaded.
+
+        While a changed artifact is reloaded, or if reloading it fails, the
+        previously loaded one keeps being served.
+        """
+        entry = self._entries[name]
+        if entry.value is not None and not self._changed(entry):
+            return entry.value
+        with entry.lock:
+            files = self._stat_files(entry)
+            if entry.value is not None and files == entry.files:
+                return entry.value
+            if entry.failed_at is not None and time.monotonic() - entry.failed_at < self.retry_interval:
+                return entry.value
+            started = time.perf_counter()
+            try:
+                value, path = self._load(entry)
+            except Exception as e:
+                entry.error = str(e)
+                entry.failed_at = time.monotonic()
+                if self.logger:
+                    self.logger.error("Error loading %s: %s", name, e)
+                return entry.value
+            backend = "default"
+            if entry.compiler is not None:
+                try:
+                    value = entry.compiler(value)
+                    backend = "compiled"
+                except Exception as e:
+                    if self.logger:
+                        self.logger.warning("Serving %s uncompiled: %s", name, e)
+            reloaded = entry.value is not None
+            entry.value, entry.path, entry.backend, entry.files = value, path, backend, files
+            entry.load_seconds = round(time.perf_counter() - started, 3)
+            entry.error = None
+            entry.failed_at = None
+            if self.logger:
+                self.logger.info("Reloaded %s" if reloaded else "Loaded %s", name,
+                                 extra={"path": entry.path, "seconds": entry.load_seconds})
+            return entry.value
+
+    def version(self, name):
+        """``(path, mtime_ns, size)`` of every candidate file as of the last load, or None."""
+        return self._entries[name].files
+
+    def preload(self, names=None):
+        """Load ``names`` (default: all) now, e.g. in the master before workers fork."""
+        for name in names or list(self._entries):
+            self.get(name)
+
+    def stats(self):
+        return {
+            name: {
+                "loaded": entry.value is not None,
+                "path": entry.path,
+                "backend": entry.backend,
+                "load_seconds": entry.load_seconds,
+                "error": entry.error
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+def uncompress(path):
+    """Re-dump ``path`` uncompressed in place, for faster loads."""
+    value = joblib.load(path)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(value, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+
+
+def main(argv):
+    if len(argv) > 2 and argv[1] == "uncompress":
+        for path in argv[2:]:
+            uncompress(path)
+            print(f"uncompressed {path}")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+from pymongo import monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+# Upper bounds (ms) of the checkout wait histogram; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+
+def pool_options():
+    """MongoClient pool and timeout settings from the environment."""
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        "maxConnecting": int(os.getenv("MONGO_MAX_CONNECTING", 2)),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", 300000)),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    }
+
+
+def browse_read_options():
+    """Read preference and concern for browse/search/ratings reads.
+
+    Defaults to secondaryPreferred with ``local`` concern, so these reads
+    leave the primary to auth and writes whenever a secondary is up.
+    MONGO_BROWSE_MAX_STALENESS_S bounds how far behind a secondary may be
+    (at least 90 seconds, per the server).
+    """
+    mode = read_pref_mode_from_name(os.getenv("MONGO_BROWSE_READ_PREFERENCE", "secondaryPreferred"))
+    max_staleness = int(os.getenv("MONGO_BROWSE_MAX_STALENESS_S", -1))
+    return {
+        "read_preference": make_read_preference(mode, None, max_staleness),
+        "read_concern": ReadConcern(os.getenv("MONGO_BROWSE_READ_CONCERN", "local"))
+    }
+
+
+def browse_collection(db, name):
+    """``db[name]`` routed by ``browse_read_options``; works for sync and async databases."""
+    return db.get_collection(name, **browse_read_options())
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters: checkouts, failures, connections in use and wait times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.in_use = {}
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.pool_clears = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        # pymongo >= 4.7 reports the wait itself; older versions are timed per thread
+        wait = getattr(event, "duration", None)
+        if wait is None:
+            wait = time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+        wait_ms = wait * 1000
+        bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if wait_ms <= bound), len(WAIT_BUCKETS_MS))
+        address = "%s:%s" % event.address
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.wait_buckets[bucket] += 1
+            self.in_use[address] = self.in_use.get(address, 0) + 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        address = "%s:%s" % event.address
+        with self._lock:
+            self.in_use[address] = max(0, self.in_use.get(address, 0) - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "in_use": dict(self.in_use),
+                "connections_open": self.connections_created - self.connections_closed,
+                "connections_created": self.connections_created,
+                "pool_clears": self.pool_clears,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+                "wait_histogram": dict(zip(labels, self.wait_buckets))
+            }
@@ -0,0 +1,103 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc, sort_field="created_at"):
+    """Opaque cursor pointing just past ``doc`` in (sort_field, _id) order."""
+    value = doc.get(sort_field)
+    payload = {
+        "v": value.isoformat() if isinstance(value, datetime) else value,
+        "d": isinstance(value, datetime),
+        "id": str(doc["_id"])
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = datetime.fromisoformat(payload["v"]) if payload.get("d") else payload["v"]
+        return value, ObjectId(payload["id"])
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {e}") from e
+
+
+def keyset_match(cursor, sort_field="created_at", descending=True):
+    """$match clause selecting documents after ``cursor`` in (sort_field, _id) order."""
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}}
+    ]}
+
+
+def keyset_sort(sort_field="created_at", descending=True):
+    direction = -1 if descending else 1
+    return {sort_field: direction, "_id": direction}
+
+
+class CountCache:
+    """Caches count_documents results per query for ``ttl`` seconds.
+
+    Page totals are shown as approximate, so counting once per window
+    replaces a full count on every page request.
+    """
+
+    def __init__(self, ttl=60, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _key(self, collection, query):
+        return (collection.name, json.dumps(query, sort_keys=True, default=str))
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+        return None
+
+    def _store(self, key, total):
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                self._data.clear()
+            self._data[key] = (total, time.monotonic() + self.ttl)
+
+    def count(self, collection, query):
+        key = self._key(collection, query)
+        total = self._cached(key)
+        if total is None:
+            total = collection.count_documents(query)
+            self._store(key, total)
+        return total
+
+    async def count_async(self, collection, query):
+        """``count`` for an async (Motor / AsyncMongoClient) collection."""
+        key = self._key(collection, query)
+        total = self._cached(key)
+        if total is None:
+            total = await collection.count_documents(query)
+            self._store(key, total)
+        return total
+
+    def invalidate(self, collection_name=None):
+        with self._lock:
+            if collection_name is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k[0] == collection_name]:
+                    del self._data[key]
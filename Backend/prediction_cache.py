@@ -0,0 +1,62 @@
+import hashlib
+
+from cache import TTLCache
+
+
+class PredictionCache(TTLCache):
+    """LRU/TTL cache of predictions, keyed on encoded feature tuples.
+
+    Entries belong to a model version; ``get``/``put`` with a different
+    version than the one cached so far drop every entry first.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600):
+        super().__init__(maxsize, ttl)
+        self._version = None
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._version = version
+
+    def get(self, key, version):
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            self._check_version(version)
+            return self._get(key)
+
+    def put(self, key, value, version):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._put(key, value)
+
+
+class ModelVersion:
+    """Identifies the model and encoders predictions were computed with.
+
+    The model part is the registry's version of ``name``, which changes
+    when the registry reloads a replaced artifact.
+    """
+
+    def __init__(self, registry, name, encoders=None):
+        self.registry = registry
+        self.name = name
+        self.encoder_signature = encoder_signature(encoders or {})
+
+    def current(self):
+        return (self.registry.version(self.name), self.encoder_signature)
+
+
+def encoder_signature(encoders):
+    """Digest of ``{column: encoder or list of classes}``."""
+    digest = hashlib.sha1()
+    for col in sorted(encoders):
+        digest.update(col.encode("utf-8"))
+        for cls in getattr(encoders[col], "classes_", encoders[col]):
+            digest.update(b"\0" + str(cls).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,192 @@
+"""Seller rating aggregates kept incrementally on the seller's user document.
+
+Each rating does one ``$inc`` of ``rating_sum``/``rating_count`` and of its
+star bucket in ``rating_hist``; the average is derived on read.
+``reconcile_ratings`` recomputes the counters from the ratings collection
+to repair drift, either from a background thread (in one process at a
+time, under a lease in the ``locks`` collection) or:
+
+    python ratings.py reconcile
+"""
+import json
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+STARS = ("1", "2", "3", "4", "5")
+RECONCILER_LEASE = "rating-reconciler"
+
+
+def rating_bucket(rating):
+    """Histogram key for a rating: the nearest whole star, as a string."""
+    return str(min(5, max(1, int(round(rating)))))
+
+
+def rating_summary(user):
+    """``{"avg_rating", "total_ratings", "histogram"}`` for a user document (or None)."""
+    user = user or {}
+    count = user.get("rating_count")
+    hist = user.get("rating_hist") or {}
+    histogram = {star: hist.get(star, 0) for star in STARS}
+    if count is None:
+        # Sellers rated before the counters existed, until reconciliation runs
+        return {
+            "avg_rating": user.get("avg_rating", 0),
+            "total_ratings": user.get("total_ratings", 0),
+            "histogram": histogram
+        }
+    return {
+        "avg_rating": user.get("rating_sum", 0) / count if count else 0,
+        "total_ratings": count,
+        "histogram": histogram
+    }
+
+
+def record_rating(users_collection, seller_id, rating):
+    """Count a rating that has already been inserted into the ratings collection."""
+    users_collection.update_one(
+        {"_id": seller_id},
+        {"$inc": {"rating_sum": rating, "rating_count": 1, f"rating_hist.{rating_bucket(rating)}": 1},
+         "$currentDate": {"rating_updated_at": True}}
+    )
+
+
+def _rating_totals(db, match):
+    """``{seller_id: (sum, count, histogram)}`` computed from the ratings collection."""
+    totals = {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"seller_id": "$seller_id", "star": {"$round": ["$rating", 0]}},
+            "sum": {"$sum": "$rating"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    for row in db.ratings.aggregate(pipeline):
+        seller_id = row["_id"]["seller_id"]
+        total_sum, total_count, hist = totals.get(seller_id, (0, 0, {}))
+        star = rating_bucket(row["_id"]["star"])
+        hist[star] = hist.get(star, 0) + row["count"]
+        totals[seller_id] = (total_sum + row["sum"], total_count + row["count"], hist)
+    return totals
+
+
+def remove_buyer_ratings(db, buyer_id):
+    """Subtract a buyer's ratings from each rated seller before the ratings are deleted."""
+    ops = []
+    for seller_id, (total_sum, total_count, hist) in _rating_totals(db, {"buyer_id": buyer_id}).items():
+        inc = {"rating_sum": -total_sum, "rating_count": -total_count}
+        inc.update({f"rating_hist.{star}": -n for star, n in hist.items()})
+        ops.append(UpdateOne({"_id": seller_id}, {"$inc": inc, "$currentDate": {"rating_updated_at": True}}))
+    if ops:
+        db.users.bulk_write(ops, ordered=False)
+
+
+def reconcile_ratings(db, seller_ids=None, grace=60):
+    """Reset the rating counters and histogram to what the ratings collection says.
+
+    A rating is inserted before its ``$inc``, so a rating created while we
+    compute could be counted twice: once here and once by its own ``$inc``.
+    Only ratings older than ``grace`` seconds are counted, and only sellers
+    whose counters have not moved for ``grace`` seconds are written (and
+    only if they still have not), so in-flight ratings land on top of the
+    repaired counters. Returns the number of sellers repaired.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    user_query = {"role": "seller", "$or": [
+        {"rating_updated_at": {"$lt": cutoff}},
+        {"rating_updated_at": {"$exists": False}}
+    ]}
+    rating_match = {"$or": [{"created_at": {"$lt": cutoff}}, {"created_at": {"$exists": False}}]}
+    if seller_ids is not None:
+        user_query["_id"] = {"$in": list(seller_ids)}
+        rating_match["seller_id"] = {"$in": list(seller_ids)}
+
+    current = {
+        user["_id"]: (user.get("rating_sum"), user.get("rating_count"), user.get("rating_hist"),
+                      user.get("rating_updated_at"))
+        for user in db.users.find(user_query, {"rating_sum": 1, "rating_count": 1, "rating_hist": 1,
+                                               "rating_updated_at": 1})
+    }
+    actual = _rating_totals(db, rating_match)
+
+    ops = []
+    for seller_id, (old_sum, old_count, old_hist, updated_at) in current.items():
+        new_sum, new_count, hist = actual.get(seller_id, (0, 0, {}))
+        new_hist = {star: hist.get(star, 0) for star in STARS}
+        if (old_sum, old_count, old_hist) != (new_sum, new_count, new_hist):
+            ops.append(UpdateOne(
+                {"_id": seller_id, "rating_sum": old_sum, "rating_count": old_count,
+                 "rating_updated_at": updated_at},
+                {"$set": {"rating_sum": new_sum, "rating_count": new_count, "rating_hist": new_hist},
+                 "$unset": {"avg_rating": "", "total_ratings": ""}}
+            ))
+    if not ops:
+        return 0
+    return db.users.bulk_write(ops, ordered=False).modified_count
+
+
+def take_lease(db, name, owner, ttl):
+    """Take or renew the lease ``name`` for ``ttl`` seconds; False while another owner holds it."""
+    now = datetime.utcnow()
+    try:
+        db.locks.update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Held by someone else: the filter missed and the upsert hit the existing _id
+        return False
+
+
+def start_reconciler(db, interval, logger=None):
+    """Run ``reconcile_ratings`` every ``interval`` seconds on a daemon thread.
+
+    Every worker starts one, but only the holder of the reconciler lease
+    runs passes; if it dies, another worker takes over once the lease
+    expires.
+    """
+    stop = threading.Event()
+
+    def run():
+        owner = uuid.uuid4().hex
+        # First pass right away so sellers rated before the counters existed are migrated
+        while True:
+            try:
+                if take_lease(db, RECONCILER_LEASE, owner, interval * 2):
+                    repaired = reconcile_ratings(db)
+                    if repaired and logger:
+                        logger.info("Reconciled seller ratings", extra={"repaired": repaired})
+            except Exception as e:
+                if logger:
+                    logger.error("Error reconciling seller ratings: %s", e)
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=run, name="rating-reconciler", daemon=True)
+    thread.start()
+    return stop
+
+
+def main(argv):
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/")).vehicle_marketplace
+    if len(argv) > 1 and argv[1] == "reconcile":
+        print(json.dumps({"repaired": reconcile_ratings(db)}))
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
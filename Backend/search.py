@@ -0,0 +1,113 @@
+import math
+
+# Text index declared in db_indexes.py
+TEXT_INDEX_NAME = "listing_text"
+# make/model hits rank above title hits, which rank above description hits
+TEXT_INDEX_WEIGHTS = {"make": 10, "model": 10, "title": 5, "description": 1}
+
+# Lower bounds of each band; the last band is open-ended
+YEAR_BANDS = [0, 2000, 2005, 2010, 2015, 2020]
+PRICE_BANDS = [0, 2500000, 5000000, 10000000, 20000000, 50000000]
+
+
+def band_range(bands, lower):
+    """(lower, upper) bounds of the band starting at ``lower``; upper is None for the last band."""
+    if lower not in bands:
+        raise ValueError(f"Unknown band {lower}; expected one of {bands}")
+    i = bands.index(lower)
+    return lower, bands[i + 1] if i + 1 < len(bands) else None
+
+
+def band_label(bands, lower):
+    lower, upper = band_range(bands, lower)
+    return f"{lower}+" if upper is None else f"{lower}-{upper - 1}"
+
+
+def _bucket(field, bands):
+    return {"$bucket": {
+        "groupBy": f"${field}",
+        "boundaries": bands + [math.inf],
+        "default": "unknown",
+        "output": {"count": {"$sum": 1}}
+    }}
+
+
+def _range_filter(bands, lower):
+    lower, upper = band_range(bands, lower)
+    clause = {"$gte": lower}
+    if upper is not None:
+        clause["$lt"] = upper
+    return clause
+
+
+def build_filters(make=None, condition=None, year_band=None, price_band=None):
+    filters = {}
+    if make:
+        filters["make"] = make
+    if condition:
+        filters["condition"] = condition
+    if year_band is not None:
+        filters["year"] = _range_filter(YEAR_BANDS, year_band)
+    if price_band is not None:
+        filters["price"] = _range_filter(PRICE_BANDS, price_band)
+    return filters
+
+
+def build_search_pipeline(text, base_query, filters, skip, limit, result_stages=()):
+    """One aggregate returning ranked results, the total, and facet counts.
+
+    With ``text`` the match is served by the text index and results are
+    ordered by relevance; without it, newest listings come first.
+    """
+    match = dict(base_query)
+    match.update(filters)
+    if text:
+        match["$text"] = {"$search": text}
+        sort = {"score": -1, "created_at": -1, "_id": -1}
+    else:
+        sort = {"created_at": -1, "_id": -1}
+
+    pipeline = [{"$match": match}]
+    if text:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+    pipeline.append({"$facet": {
+        "results": [{"$sort": sort}, {"$skip": skip}, {"$limit": limit}, *result_stages],
+        "total": [{"$count": "count"}],
+        "make": [
+            {"$group": {"_id": "$make", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ],
+        "condition": [
+            {"$group": {"_id": "$condition", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ],
+        "year_band": [_bucket("year", YEAR_BANDS)],
+        "price_band": [_bucket("price", PRICE_BANDS)]
+    }})
+    return pipeline
+
+
+def format_facets(raw):
+    """Turn the $facet output into ``{"results", "total", "facets"}``."""
+    def values(rows):
+        return [{"value": row["_id"], "count": row["count"]} for row in rows if row["_id"] is not None]
+
+    def bands(rows, bounds):
+        out = []
+        for row in rows:
+            if row["_id"] == "unknown":
+                continue
+            lower = int(row["_id"])
+            out.append({"value": lower, "label": band_label(bounds, lower), "count": row["count"]})
+        return out
+
+    return {
+        "results": raw.get("results", []),
+        "total": raw["total"][0]["count"] if raw.get("total") else 0,
+        "facets": {
+            "make": values(raw.get("make", [])),
+            "condition": values(raw.get("condition", [])),
+            "year_band": bands(raw.get("year_band", []), YEAR_BANDS),
+            "price_band": bands(raw.get("price_band", []), PRICE_BANDS)
+        }
+    }
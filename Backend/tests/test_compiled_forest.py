@@ -0,0 +1,65 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+ensemble = pytest.importorskip("sklearn.ensemble")
+
+from compiled_forest import UnsupportedModel, compile_model, probe_rows  # noqa: E402
+
+MODELS = [ensemble.RandomForestRegressor, ensemble.ExtraTreesRegressor]
+
+
+def fitted(model_cls, seed=0):
+    rng = np.random.default_rng(seed)
+    # Mixed scales like the price features: codes, years, engine cc, mileage
+    X = np.column_stack([
+        rng.integers(0, 40, 500),
+        rng.integers(1990, 2025, 500),
+        rng.uniform(600, 5000, 500),
+        rng.uniform(0, 300000, 500)
+    ]).astype(np.float64)
+    y = X[:, 1] * 1000 - X[:, 3] * 0.5 + X[:, 2] * 3 + rng.normal(0, 1000, 500)
+    return model_cls(n_estimators=20, max_depth=12, random_state=seed).fit(X, y)
+
+
+@pytest.mark.parametrize("model_cls", MODELS)
+def test_parity_on_probe_rows(model_cls):
+    model = fitted(model_cls)
+    X = probe_rows(model, n=1000, seed=1)
+    assert np.array_equal(compile_model(model).predict_compiled(X), model.predict(X))
+
+
+@pytest.mark.parametrize("model_cls", MODELS)
+def test_parity_on_random_rows(model_cls):
+    model = fitted(model_cls)
+    rng = np.random.default_rng(2)
+    # Includes values outside the training range
+    X = rng.uniform([-5, 1980, 0, -1000], [50, 2030, 8000, 400000], size=(1000, 4))
+    assert np.array_equal(compile_model(model).predict_compiled(X), model.predict(X))
+
+
+@pytest.mark.parametrize("model_cls", MODELS)
+def test_parity_with_missing_values(model_cls):
+    model = fitted(model_cls)
+    X = probe_rows(model, n=500, seed=3)
+    X[::3, 2] = np.nan
+    assert np.array_equal(compile_model(model).predict_compiled(X), model.predict(X))
+
+
+def test_single_row():
+    model = fitted(ensemble.RandomForestRegressor)
+    row = probe_rows(model, n=1)[0]
+    assert compile_model(model).predict(row)[0] == model.predict(row.reshape(1, -1))[0]
+
+
+def test_large_batches_go_to_sklearn(monkeypatch):
+    model = fitted(ensemble.RandomForestRegressor)
+    compiled = compile_model(model, max_rows=10)
+    monkeypatch.setattr(compiled, "predict_compiled", lambda X: pytest.fail("walked a large batch"))
+    X = probe_rows(model, n=11)
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+
+def test_rejects_unsupported_models():
+    model = ensemble.GradientBoostingRegressor(n_estimators=5).fit(np.arange(20.0).reshape(10, 2), np.arange(10.0))
+    with pytest.raises(UnsupportedModel):
+        compile_model(model)
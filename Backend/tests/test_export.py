@@ -0,0 +1,23 @@
+import csv
+
+import pytest
+
+pytest.importorskip("flask")
+
+from export import _csv  # noqa: E402
+
+
+def rendered(rows, fields):
+    return list(csv.reader("".join(_csv(rows, fields)).splitlines()))[1]
+
+
+def test_csv_neutralizes_formulas():
+    rows = [{"title": "=HYPERLINK(\"http://x\")", "tags": ["@SUM(A1)", "b"], "note": "-1+2", "town": "\tcolombo"}]
+    assert rendered(rows, ["title", "tags", "note", "town"]) == [
+        "'=HYPERLINK(\"http://x\")", "'@SUM(A1);b", "'-1+2", "'\tcolombo"
+    ]
+
+
+def test_csv_leaves_plain_values_alone():
+    rows = [{"make": "toyota", "price": 4500000, "change": -5, "rating": 4.5, "sold": None}]
+    assert rendered(rows, ["make", "price", "change", "rating", "sold"]) == ["toyota", "4500000", "-5", "4.5", ""]
@@ -0,0 +1,41 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from feature_schema import PRICE_FEATURE_ORDER, FeatureSchema, SchemaMismatch  # noqa: E402
+
+
+def dataset():
+    return pd.DataFrame({
+        "make": ["toyota", "honda", "toyota"],
+        "model": ["axio", "fit", "vitz"],
+        "engine": [1500, 1300, 1000],
+        "transmission_type": ["automatic", "automatic", "manual"],
+        "fuel_type": ["petrol", "hybrid", "petrol"],
+        "mileage": [52000, 81000, 12000],
+        "town": ["colombo", "kandy", "galle"],
+        "leasing": ["no leasing", "ongoing lease", "no leasing"],
+        "condition": ["used", "used", "new"],
+        "car_age": [9.0, 12.0, 2.0]
+    })
+
+
+def test_round_trip_keeps_codes_order_and_dtypes(tmp_path):
+    schema = FeatureSchema.from_dataset(dataset())
+    schema.save(tmp_path / "schema.json")
+    loaded = FeatureSchema.load(tmp_path / "schema.json")
+    assert loaded.feature_order == PRICE_FEATURE_ORDER
+    assert loaded.categories["make"] == ["honda", "toyota"]
+    assert loaded.numeric == {"engine": "int64", "mileage": "int64", "car_age": "float64"}
+
+
+def test_numeric_values_are_cast_to_the_trained_dtype():
+    schema = FeatureSchema.from_dataset(dataset())
+    assert schema.cast("engine", 1500.0) == 1500 and isinstance(schema.cast("engine", 1500.0), int)
+    assert schema.cast("car_age", 3) == 3.0 and isinstance(schema.cast("car_age", 3), float)
+    assert schema.numeric_column("mileage", [1.0, 2.0]).dtype == "int64"
+
+
+def test_numeric_features_need_a_dtype():
+    with pytest.raises(SchemaMismatch):
+        FeatureSchema(PRICE_FEATURE_ORDER, {"make": []}, {"engine": "float64"})
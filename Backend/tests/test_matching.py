@@ -0,0 +1,40 @@
+from matching import FieldMatcher, build_matchers
+
+MAKES = ["audi", "bmw", "honda", "mazda", "mitsubishi", "nissan", "suzuki", "toyota"]
+GEARS = ["automatic", "manual", "tiptronic"]
+
+
+def test_exact_and_synonym():
+    gears = FieldMatcher(GEARS, "transmission_type")
+    assert gears.match(" Manual ") == ("manual", 1, 1.0, "exact")
+    assert gears.match("auto").kind == "synonym"
+    assert gears.match("auto").value == "automatic"
+
+
+def test_partial():
+    makes = FieldMatcher(MAKES, "make")
+    result = makes.match("toyota corolla")
+    assert (result.value, result.kind) == ("toyota", "partial")
+
+
+def test_typos_match_fuzzily():
+    matchers = build_matchers({"make": MAKES, "transmission_type": GEARS})
+    for col, typo, expected in [
+        ("make", "toyta", "toyota"),
+        ("make", "nisan", "nissan"),
+        ("make", "mitsubshi", "mitsubishi"),
+        ("make", "hondda", "honda"),
+        ("transmission_type", "autmatic", "automatic"),
+        ("transmission_type", "manul", "manual"),
+    ]:
+        result = matchers[col].match(typo)
+        assert result is not None, typo
+        assert (result.value, result.kind) == (expected, "fuzzy"), typo
+        assert result.code == matchers[col].classes.index(expected)
+
+
+def test_unrelated_input_does_not_match():
+    makes = FieldMatcher(MAKES, "make")
+    assert makes.match("lamborghini") is None
+    assert makes.match("xyz") is None
+    assert makes.match("") is None
@@ -0,0 +1,165 @@
+import atexit
+import hashlib
+import math
+import os
+import threading
+import time
+
+from pymongo import UpdateOne
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        """Add ``key``; returns True if it was (probably) not present before."""
+        new = False
+        for p in self._positions(key):
+            byte, mask = p >> 3, 1 << (p & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                new = True
+        return new
+
+
+class RotatingBloomFilter:
+    """Two Bloom filters swapped every ``window`` seconds.
+
+    A key is remembered for between one and two windows, and memory stays
+    fixed however many sessions view listings.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, window=86400):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.rotated_at = time.monotonic()
+
+    def add(self, key):
+        now = time.monotonic()
+        if now - self.rotated_at >= self.window:
+            self.previous, self.current = self.current, BloomFilter(self.capacity, self.error_rate)
+            self.rotated_at = now
+        seen = key in self.previous
+        return self.current.add(key) and not seen
+
+
+class ViewCounter:
+    """Buffers listing view events and flushes merged ``$inc``s in one bulk_write.
+
+    Views are flushed every ``flush_interval`` seconds or as soon as
+    ``max_events`` have accumulated. With dedup enabled, a view from a
+    session that has not seen the listing in the current window also counts
+    towards ``unique_views``. Each worker keeps its own filter, so unique
+    counts are approximate across workers.
+    """
+
+    def __init__(self, collection, flush_interval=1.0, max_events=500, dedup=True,
+                 dedup_capacity=1000000, dedup_window=86400, logger=None):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.logger = logger
+        self.seen = RotatingBloomFilter(dedup_capacity, window=dedup_window) if dedup else None
+        self._pending = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.flushed_events = 0
+        self.flushes = 0
+        self._start()
+        atexit.register(self.close)
+        # The flush thread does not survive fork (gunicorn --preload), so each
+        # child starts its own; views buffered before the fork stay with the parent
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="view-counter", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        self._pending = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._start()
+
+    def record(self, vehicle_id, session_key=None):
+        with self._lock:
+            unique = 0
+            if self.seen is not None and session_key:
+                unique = 1 if self.seen.add(f"{vehicle_id}:{session_key}") else 0
+            views, uniques = self._pending.get(vehicle_id, (0, 0))
+            self._pending[vehicle_id] = (views + 1, uniques + unique)
+            self._events += 1
+            if self._events >= self.max_events:
+                self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                events, self._events = self._events, 0
+            if not pending:
+                return 0
+            ops = []
+            for vehicle_id, (views, uniques) in pending.items():
+                inc = {"views": views}
+                if uniques:
+                    inc["unique_views"] = uniques
+                ops.append(UpdateOne({"_id": vehicle_id}, {"$inc": inc}))
+            try:
+                self.collection.bulk_write(ops, ordered=False)
+            except Exception as e:
+                # Put the counts back so the next flush retries them
+                with self._lock:
+                    for vehicle_id, (views, uniques) in pending.items():
+                        old_views, old_uniques = self._pending.get(vehicle_id, (0, 0))
+                        self._pending[vehicle_id] = (old_views + views, old_uniques + uniques)
+                    self._events += events
+                if self.logger:
+                    self.logger.error("Error flushing view counts: %s", e)
+                return 0
+            self.flushed_events += events
+            self.flushes += 1
+            return events
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending_events": self._events,
+                "pending_vehicles": len(self._pending),
+                "flushed_events": self.flushed_events,
+                "flushes": self.flushes
+            }
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
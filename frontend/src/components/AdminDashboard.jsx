@@ -315,7 +315,7 @@ const AdminDashboard = () => {
                     {listing.images && listing.images.length > 0 ? (
                       <div className="listing-image">
                         <img
-                          src={`http://localhost:5002${listing.images[0]}`}
+                          src={`http://localhost:5002${listing.images[0]}?w=320`}
                           alt={listing.title}
                           onError={(e) => {
                             e.target.src = '/placeholder.jpg';
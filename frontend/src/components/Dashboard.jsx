@@ -158,7 +158,7 @@ const Dashboard = () => {
                 {cars.map((car) => (
                   <div key={car._id} className="car-card">
                     <img
-                      src={car.images && car.images.length > 0 ? `http://localhost:5002${car.images[0]}` : '/placeholder.jpg'}
+                      src={car.images && car.images.length > 0 ? `http://localhost:5002${car.images[0]}?w=320` : '/placeholder.jpg'}
                       alt={car.title || 'Vehicle'}
                       className="car-image"
                       onError={(e) => { e.target.src = '/placeholder.jpg'; console.error(`Image load failed for ${car.images[0]}`); }}
@@ -70,6 +70,16 @@ const SellerDash = () => {
   };
 
   // Handle form submission for new listing
+  const waitForListing = async (id) => {
+    for (let attempt = 0; attempt < 40; attempt++) {
+      const { data } = await axios.get(`http://localhost:5002/api/listings/${id}/status`, { withCredentials: true });
+      if (data.status === 'failed') throw new Error(data.error || 'Failed to save listing');
+      if (data.status !== 'processing') return;
+      await new Promise(resolve => setTimeout(resolve, 250));
+    }
+    throw new Error('Listing is still being saved, check My Listings shortly');
+  };
+
   const handleSubmitListing = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -87,10 +97,12 @@ const SellerDash = () => {
       }
       newListing.images.forEach(file => formData.append('images', file));
 
-      await axios.post('http://localhost:5002/api/listings', formData, {
+      const created = await axios.post('http://localhost:5002/api/listings', formData, {
         withCredentials: true,
         headers: { 'Content-Type': 'multipart/form-data' }
       });
+      // Images are moved into place and the listing saved in the background
+      await waitForListing(created.data.id);
 
       // Refresh listings
       const response = await axios.get('http://localhost:5002/api/my-listings', { withCredentials: true });
@@ -109,7 +121,7 @@ const SellerDash = () => {
       setError(null);
       alert('Listing submitted successfully!');
     } catch (err) {
-      setError(err.response?.data?.error || 'Failed to submit listing');
+      setError(err.response?.data?.error || err.message || 'Failed to submit listing');
     } finally {
       setLoading(false);
     }
@@ -273,7 +285,7 @@ const SellerDash = () => {
                   <div key={listing._id} className="listing-card">
                     <div className="listing-image">
                       {listing.images.length > 0 ? (
-                        <img src={`http://localhost:5002${listing.images[0]}`} alt={listing.title} />
+                        <img src={`http://localhost:5002${listing.images[0]}?w=320`} alt={listing.title} />
                       ) : (
                         <div className="image-placeholder">Vehicle Image</div>
                       )}
@@ -52,11 +52,12 @@ const PricePrediction = ({ setActiveTab, handleLogout }) => {
     }
   };
 
+  // Whole make -> model -> year tree, fetched once from /api/catalog
+  const [catalog, setCatalog] = useState(null);
+
   // Load initial data
   useEffect(() => {
-    loadMakes();
-    loadTowns();
-    loadMileageRanges();
+    loadCatalog();
   }, []);
 
   // API calls
@@ -82,87 +83,57 @@ const PricePrediction = ({ setActiveTab, handleLogout }) => {
     }
   };
 
-  const loadMakes = async () => {
-    try {
-      const makes = await apiCall('/api/makes');
-      setOptions(prev => ({ ...prev, makes }));
-    } catch (err) {
-      setError('Failed to load makes');
-    }
-  };
-
-  const loadModels = async (make) => {
-    if (!make) return;
+  const loadCatalog = async () => {
     try {
       setLoading(true);
-      const models = await apiCall(`/api/models/${make}`);
-      setOptions(prev => ({ ...prev, models }));
-    } catch (err) {
-      setError('Failed to load models');
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  const loadYears = async (make, model) => {
-    if (!make || !model) return;
-    try {
-      setLoading(true);
-      const years = await apiCall(`/api/years/${make}/${model}`);
-      setOptions(prev => ({ ...prev, years }));
+      const data = await apiCall('/api/catalog');
+      setCatalog(data);
+      setOptions(prev => ({
+        ...prev,
+        makes: data.makes.map(make => make.name),
+        towns: data.towns,
+        mileage_ranges: data.mileage_ranges
+      }));
     } catch (err) {
-      setError('Failed to load years');
+      setError('Failed to load vehicle options');
     } finally {
       setLoading(false);
     }
   };
 
-  const loadFuelTypes = async (make, model, year) => {
-    if (!make || !model || !year) return;
-    try {
-      const fuel_types = await apiCall(`/api/fuel_types/${make}/${model}/${year}`);
-      setOptions(prev => ({ ...prev, fuel_types }));
-    } catch (err) {
-      setError('Failed to load fuel types');
-    }
+  const findModel = (make, model) => {
+    const makeNode = catalog && catalog.makes.find(m => m.name === make);
+    return makeNode ? makeNode.models.find(m => m.name === model) : undefined;
   };
 
-  const loadTransmissions = async (make, model, year) => {
-    if (!make || !model || !year) return;
-    try {
-      const transmissions = await apiCall(`/api/transmissions/${make}/${model}/${year}`);
-      setOptions(prev => ({ ...prev, transmissions }));
-    } catch (err) {
-      setError('Failed to load transmissions');
-    }
+  const findYear = (make, model, year) => {
+    const modelNode = findModel(make, model);
+    return modelNode ? modelNode.years.find(y => String(y.year) === String(year)) : undefined;
   };
 
-  const loadEngineSizes = async (make, model, year) => {
-    if (!make || !model || !year) return;
-    try {
-      const engine_sizes = await apiCall(`/api/engine_sizes/${make}/${model}/${year}`);
-      setOptions(prev => ({ ...prev, engine_sizes }));
-    } catch (err) {
-      setError('Failed to load engine sizes');
-    }
+  const loadModels = (make) => {
+    if (!make || !catalog) return;
+    const makeNode = catalog.makes.find(m => m.name === make);
+    const models = makeNode ? makeNode.models.map(m => m.name) : [];
+    setOptions(prev => ({ ...prev, models }));
   };
 
-  const loadTowns = async () => {
-    try {
-      const towns = await apiCall('/api/towns');
-      setOptions(prev => ({ ...prev, towns }));
-    } catch (err) {
-      setError('Failed to load towns');
-    }
+  const loadYears = (make, model) => {
+    if (!make || !model) return;
+    const modelNode = findModel(make, model);
+    const years = modelNode ? modelNode.years.map(y => y.year) : [];
+    setOptions(prev => ({ ...prev, years }));
   };
 
-  const loadMileageRanges = async () => {
-    try {
-      const mileage_ranges = await apiCall('/api/mileage_ranges');
-      setOptions(prev => ({ ...prev, mileage_ranges }));
-    } catch (err) {
-      setError('Failed to load mileage ranges');
-    }
+  const loadYearOptions = (make, model, year) => {
+    if (!make || !model || !year) return;
+    const yearNode = findYear(make, model, year);
+    setOptions(prev => ({
+      ...prev,
+      fuel_types: yearNode ? yearNode.fuel_types : [],
+      transmissions: yearNode ? yearNode.transmissions : [],
+      engine_sizes: yearNode ? yearNode.engine_sizes : []
+    }));
   };
 
   // Handle form changes
@@ -190,7 +161,7 @@ const PricePrediction = ({ setActiveTab, handleLogout }) => {
         transmissions: [],
         engine_sizes: []
       }));
-      if (value) await loadModels(value);
+      if (value) loadModels(value);
     }
 
     if (field === 'model') {
@@ -209,7 +180,7 @@ const PricePrediction = ({ setActiveTab, handleLogout }) => {
         transmissions: [],
         engine_sizes: []
       }));
-      if (value && formData.make) await loadYears(formData.make, value);
+      if (value && formData.make) loadYears(formData.make, value);
     }
 
     if (field === 'year') {
@@ -227,9 +198,7 @@ const PricePrediction = ({ setActiveTab, handleLogout }) => {
         engine_sizes: []
       }));
       if (value && formData.make && formData.model) {
-        await loadFuelTypes(formData.make, formData.model, value);
-        await loadTransmissions(formData.make, formData.model, value);
-        await loadEngineSizes(formData.make, formData.model, value);
+        loadYearOptions(formData.make, formData.model, value);
       }
     }
 